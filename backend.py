@@ -1,26 +1,75 @@
 import os
 import json
+import base64
 import hashlib
 import uuid
-from datetime import datetime, timedelta
+import time
+import asyncio
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks, Query
+import numpy as np
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, validator, EmailStr
 import jwt
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func, desc, tuple_, update, delete, bindparam, case
 from sqlalchemy.exc import SQLAlchemyError
 
-from database import get_db, User, Startup, Comment, Like, AnalyticsEvent, AIAnalysis, TelegramEvent, MentorshipRequest
+from database import get_async_db, get_read_db, get_pool_stats, get_job_queue_stats, enqueue_job, json_contains, track_analytics_events, increment_startup_counters, counter_shards, truncate_time, AsyncSessionLocal, CATALOG_VISIBLE, CATALOG_ORDER, catalog_query, MENTOR_EXPERIENCE, User, Startup, Comment, Like, AnalyticsEvent, AnalyticsRollupHourly, AnalyticsRollupDaily, AIAnalysis, TelegramEvent, MentorshipRequest, NotificationOutbox, MatchFeed
+from matching import matching_index, profile_snapshot, rematch_job_for, replace_match_feed
+from similarity import similarity_index
 
 # Настройки
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-jwt")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 дней
 
+# Буфер просмотров каталога
+VIEW_BUFFER_MAX_SIZE = int(os.getenv("VIEW_BUFFER_MAX_SIZE", "10000"))
+VIEW_FLUSH_BATCH_SIZE = int(os.getenv("VIEW_FLUSH_BATCH_SIZE", "500"))
+VIEW_FLUSH_INTERVAL = float(os.getenv("VIEW_FLUSH_INTERVAL", "5"))  # секунды
+
+# Отложенный пересчет оценок стартапов (лайки, комментарии)
+SCORE_RECOMPUTE_INTERVAL = float(os.getenv("SCORE_RECOMPUTE_INTERVAL", "5"))  # окно объединения, секунды
+SCORE_RECOMPUTE_BATCH_SIZE = int(os.getenv("SCORE_RECOMPUTE_BATCH_SIZE", "500"))  # стартапов за одну транзакцию
+SCORE_DEFAULT_BASE = float(os.getenv("SCORE_DEFAULT_BASE", "50"))  # базовая оценка стартапа без AI-анализа
+
+# Кэш ответов каталога
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "1000"))
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "30"))  # секунды
+
+# Кэш детальных карточек стартапов (по версии стартапа)
+STARTUP_DETAIL_CACHE_SIZE = int(os.getenv("STARTUP_DETAIL_CACHE_SIZE", "10000"))
+STARTUP_DETAIL_CACHE_TTL = float(os.getenv("STARTUP_DETAIL_CACHE_TTL", "300"))  # секунды
+
+# Уведомления владельцу о просмотрах инвесторов: одно на пару инвестор-стартап за окно
+INVESTOR_VIEW_NOTIFY_WINDOW = float(os.getenv("INVESTOR_VIEW_NOTIFY_WINDOW", "3600"))  # секунды
+INVESTOR_VIEW_NOTIFY_CACHE_SIZE = int(os.getenv("INVESTOR_VIEW_NOTIFY_CACHE_SIZE", "100000"))  # пар
+
+# Лайки текущего пользователя в карточках каталога
+LIKE_STATE_MAX_IDS = int(os.getenv("LIKE_STATE_MAX_IDS", "100"))  # стартапов в одном запросе
+LIKE_STATE_CACHE_SIZE = int(os.getenv("LIKE_STATE_CACHE_SIZE", "10000"))  # пользователей
+LIKE_STATE_CACHE_TTL = float(os.getenv("LIKE_STATE_CACHE_TTL", "300"))  # секунды
+LIKE_STATE_MAX_CACHED = int(os.getenv("LIKE_STATE_MAX_CACHED", "1000"))  # лайков пользователя, хранимых целиком
+
+# Кэш авторизации
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # секунды
+
+# Временные ряды аналитики
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "2000"))  # интервалов в одном ответе
+TIMESERIES_EVENT_TYPES = ["view", "like", "comment", "contact_click"]
+TIMESERIES_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1), "week": timedelta(weeks=1)}
+TIMESERIES_DEFAULT_RANGES = {"hour": timedelta(hours=48), "day": timedelta(days=30), "week": timedelta(weeks=26)}
+
 # Создаем приложение FastAPI
 app = FastAPI(
     title="Startup Platform API",
@@ -85,6 +134,18 @@ class CommentCreate(BaseModel):
     content: str = Field(..., min_length=1, max_length=1000)
     startup_id: int
 
+class UserProfileUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=2)
+    bio: Optional[str] = None
+    skills: Optional[List[str]] = None
+    investment_interests: Optional[List[str]] = None
+    investment_range: Optional[Dict[str, float]] = None
+    investment_regions: Optional[List[str]] = None
+    mentor_specialties: Optional[List[str]] = None
+    mentor_experience: Optional[int] = Field(None, ge=0)
+    mentor_hourly_rate: Optional[float] = Field(None, ge=0)
+    mentor_availability: Optional[bool] = None
+
 class MentorshipRequestCreate(BaseModel):
     mentor_id: int
     startup_id: Optional[int] = None
@@ -109,16 +170,108 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def encode_cursor(values: List[Any]) -> str:
+    """Упаковка позиции keyset-пагинации в непрозрачный курсор"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Распаковка курсора; ValueError если курсор поврежден"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Некорректный курсор")
+    return values
+
+# Кэши в памяти процесса
+class TTLCache:
+    """LRU-кэш с ограниченным временем жизни записей"""
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+    
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+    
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+    
+    def invalidate_where(self, predicate) -> int:
+        """Удаление всех записей, ключ которых удовлетворяет условию"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            self.stats["invalidations"] += len(keys)
+            return len(keys)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0
+        }
+
 # Зависимости
 security = HTTPBearer()
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Компактные данные авторизованного пользователя (без загрузки ORM-объекта)"""
+    id: int
+    role: str
+    name: Optional[str]
+    telegram_linked: bool
+
+# token -> user_id и user_id -> UserPrincipal
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+principal_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+def decode_access_token(token: str) -> int:
+    """Проверка JWT и получение id пользователя (с кэшированием)"""
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -135,7 +288,58 @@ async def get_current_user(
             detail="Не удалось проверить токен"
         )
     
-    user = db.query(User).filter(User.id == user_id).first()
+    # Токен не должен пережить в кэше свой срок действия
+    user_id = int(user_id)
+    ttl = AUTH_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, user_id, ttl=ttl)
+    return user_id
+
+def invalidate_user(user_id: int):
+    """Сброс кэшированных данных пользователя после изменения профиля"""
+    principal_cache.invalidate(user_id)
+
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> UserPrincipal:
+    user_id = decode_access_token(credentials.credentials)
+    
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    
+    row = (await db.execute(
+        select(User.id, User.role, User.name, User.telegram_linked, User.is_active)
+        .where(User.id == user_id)
+    )).first()
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Пользователь не найден"
+        )
+    if not row.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Аккаунт деактивирован"
+        )
+    
+    principal = UserPrincipal(
+        id=row.id,
+        role=row.role,
+        name=row.name,
+        telegram_linked=bool(row.telegram_linked)
+    )
+    principal_cache.set(user_id, principal)
+    return principal
+
+async def get_current_user(
+    principal: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user = await db.scalar(select(User).where(User.id == principal.id))
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -227,102 +431,41 @@ class AIService:
         }
     
     @staticmethod
-    def match_startup_to_investors(startup_id: int, db: Session) -> List[int]:
-        """Мэтчинг стартапа с подходящими инвесторами"""
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
+    async def match_startup_to_investors(startup_id: int, db: AsyncSession) -> List[Dict[str, Any]]:
+        """Мэтчинг стартапа с инвесторами: топ-k по оценке с разбивкой по признакам (ошибки - вызывающему)"""
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
         if not startup:
             return []
         
-        # Поиск инвесторов по интересам и региону
-        try:
-            matched_investors = db.query(User).filter(
-                User.role == "investor",
-                User.is_active == True
-            ).all()
-            
-            # Фильтруем вручную для совместимости с разными базами данных
-            filtered_investors = []
-            for investor in matched_investors:
-                # Проверяем инвестиционные интересы
-                if (investor.investment_interests and 
-                    startup.category in investor.investment_interests):
-                    filtered_investors.append(investor)
-                # Или проверяем регион
-                elif (investor.investment_regions and 
-                      startup.region and 
-                      startup.region in investor.investment_regions):
-                    filtered_investors.append(investor)
-            
-            return [inv.id for inv in filtered_investors]
-        except Exception as e:
-            print(f"Ошибка при мэтчинге инвесторов: {e}")
-            return []
+        # Векторная оценка всех инвесторов: интересы, регионы, диапазон инвестиций
+        await matching_index.ensure_fresh(db)
+        return matching_index.rank_investors(startup.category, startup.region, startup.investment_asked)
     
     @staticmethod
-    def match_startup_to_mentors(startup_id: int, db: Session) -> List[int]:
-        """Мэтчинг стартапа с подходящими менторами"""
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
+    async def match_startup_to_mentors(startup_id: int, db: AsyncSession) -> List[Dict[str, Any]]:
+        """Мэтчинг стартапа с менторами: топ-k по оценке с разбивкой по признакам (ошибки - вызывающему)"""
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
         if not startup:
             return []
         
-        # Поиск менторов по специализациям
-        try:
-            matched_mentors = db.query(User).filter(
-                User.role == "mentor",
-                User.is_active == True,
-                User.mentor_availability == True
-            ).all()
-            
-            # Фильтруем вручную для совместимости
-            filtered_mentors = []
-            for mentor in matched_mentors:
-                if (mentor.mentor_specialties and 
-                    startup.category in mentor.mentor_specialties):
-                    filtered_mentors.append(mentor)
-            
-            return [mentor.id for mentor in filtered_mentors]
-        except Exception as e:
-            print(f"Ошибка при мэтчинге менторов: {e}")
-            return []
+        # Векторная оценка всех доступных менторов: специализации и опыт
+        await matching_index.ensure_fresh(db)
+        return matching_index.rank_mentors(startup.category)
 
-# Telegram Service Mock (в реальном проекте здесь будет интеграция с Telegram Bot API)
+# Telegram Service (уведомления доставляет воркер: python worker.py notifications)
 class TelegramService:
     @staticmethod
-    def send_notification(user_id: int, message: str, db: Session):
-        """Отправка уведомления в Telegram"""
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user or not user.telegram_linked:
-            return False
-        
-        try:
-            # Логируем событие
-            event = TelegramEvent(
-                user_id=user_id,
-                event_type="notification_sent",
-                metadata={
-                    "message_type": "notification",
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "user_telegram": user.telegram_username,
-                    "message_preview": message[:100]
-                }
-            )
-            db.add(event)
-            db.commit()
-            
-            # В реальном проекте здесь будет вызов Telegram Bot API
-            print(f"📨 Telegram notification to {user.telegram_username}: {message}")
-            return True
-        except Exception as e:
-            print(f"Ошибка при отправке Telegram уведомления: {e}")
-            db.rollback()
-            return False
+    def send_notification(user_id: int, message: str, db: AsyncSession):
+        """Постановка уведомления в outbox в транзакции вызывающего (коммитит вызывающий)"""
+        db.add(NotificationOutbox(user_id=user_id, message=message))
+        return True
     
     @staticmethod
-    def initiate_contact(user_id: int, target_user_id: int, startup_id: Optional[int] = None, db: Session = None):
+    async def initiate_contact(user_id: int, target_user_id: int, startup_id: Optional[int] = None, db: AsyncSession = None):
         """Инициация контакта между пользователями"""
         try:
-            from_user = db.query(User).filter(User.id == user_id).first()
-            to_user = db.query(User).filter(User.id == target_user_id).first()
+            from_user = await db.scalar(select(User).where(User.id == user_id))
+            to_user = await db.scalar(select(User).where(User.id == target_user_id))
             
             if not from_user or not to_user:
                 return False
@@ -333,7 +476,7 @@ class TelegramService:
                 related_user_id=target_user_id,
                 startup_id=startup_id,
                 event_type="contact_initiated",
-                metadata={
+                metadata_={
                     "action": "contact_request",
                     "timestamp": datetime.utcnow().isoformat(),
                     "from_user": from_user.telegram_username,
@@ -343,7 +486,7 @@ class TelegramService:
             db.add(event)
             
             # Отправляем уведомления обоим пользователям
-            startup = db.query(Startup).filter(Startup.id == startup_id).first() if startup_id else None
+            startup = await db.scalar(select(Startup).where(Startup.id == startup_id)) if startup_id else None
             
             message_to_investor = f"👋 Пользователь {from_user.name} хочет связаться с вами по стартапу '{startup.name if startup else 'проект'}'. Ответьте ему в личном Telegram чате: @{from_user.telegram_username.replace('@', '')}"
             message_to_startup_owner = f"👋 Пользователь {to_user.name} заинтересовался вашим стартапом '{startup.name if startup else 'проектом'}. Ответьте ему в личном Telegram чате: @{to_user.telegram_username.replace('@', '')}"
@@ -351,12 +494,354 @@ class TelegramService:
             TelegramService.send_notification(target_user_id, message_to_investor, db)
             TelegramService.send_notification(user_id, message_to_startup_owner, db)
             
-            db.commit()
+            await db.commit()
             return True
         except Exception as e:
             print(f"Ошибка при инициации контакта: {e}")
-            db.rollback()
+            await db.rollback()
+            return False
+
+# Ключ: (category, stage, region, min_score, skip, limit, cursor, include_total)
+catalog_cache = TTLCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL)
+
+def invalidate_catalog_cache(startup: Startup, scores: Optional[List[float]] = None) -> int:
+    """Сброс только тех страниц каталога, в выборку которых может попасть стартап"""
+    scores = scores if scores is not None else [startup.ai_score or 0]
+    
+    def affected(key) -> bool:
+        category, stage, region, min_score = key[:4]
+        return (
+            (not category or category == startup.category) and
+            (not stage or stage == startup.stage) and
+            (not region or region == startup.region) and
+            (not min_score or any((score or 0) >= min_score for score in scores))
+        )
+    
+    return catalog_cache.invalidate_where(affected)
+
+# startup_id -> (version, карточка); устаревшая версия перестраивается при следующем запросе
+startup_detail_cache = TTLCache(STARTUP_DETAIL_CACHE_SIZE, STARTUP_DETAIL_CACHE_TTL)
+
+# (investor_id, startup_id) -> True: владелец уже уведомлен о просмотре в текущем окне (в пределах процесса)
+investor_view_notified = TTLCache(INVESTOR_VIEW_NOTIFY_CACHE_SIZE, INVESTOR_VIEW_NOTIFY_WINDOW)
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Условный GET: If-None-Match, а при его отсутствии If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Слабое сравнение: W/ не учитывается
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
             return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+# user_id -> множество id лайкнутых стартапов (False - лайков больше LIKE_STATE_MAX_CACHED)
+like_state_cache = TTLCache(LIKE_STATE_CACHE_SIZE, LIKE_STATE_CACHE_TTL)
+
+async def get_like_state(db: AsyncSession, user_id: int, startup_ids: List[int]) -> Dict[int, bool]:
+    """Лайкнул ли пользователь каждый из стартапов: из кэша или одним запросом по индексу (user_id, startup_id)"""
+    liked = like_state_cache.get(user_id)
+    if liked is None:
+        # Все лайки пользователя - диапазон уникального индекса; большие множества не кэшируем.
+        # Кэшируемое множество читается с основной базы: отставшая реплика закрепила бы
+        # только что поставленный лайк как отсутствующий на весь TTL
+        async with AsyncSessionLocal() as primary_db:
+            rows = (await primary_db.scalars(
+                select(Like.startup_id).where(Like.user_id == user_id).limit(LIKE_STATE_MAX_CACHED + 1)
+            )).all()
+        liked = set(rows) if len(rows) <= LIKE_STATE_MAX_CACHED else False
+        like_state_cache.set(user_id, liked)
+    
+    if liked is False:
+        # Без кэша - только запрошенные стартапы, с реплики
+        liked = set((await db.scalars(
+            select(Like.startup_id).where(Like.user_id == user_id, Like.startup_id.in_(startup_ids))
+        )).all())
+    return {startup_id: startup_id in liked for startup_id in startup_ids}
+
+def update_like_state(user_id: int, startup_id: int, liked: bool):
+    """Обновление закэшированного множества лайков после лайка/снятия лайка"""
+    cached = like_state_cache.get(user_id)
+    if cached is None or cached is False:
+        return
+    if liked:
+        cached.add(startup_id)
+    else:
+        cached.discard(startup_id)
+
+# Буфер просмотров: события копятся в памяти и пишутся в БД пачками
+class ViewTracker:
+    """Сбор событий просмотра с пакетной записью в БД"""
+    
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float):
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {"queued": 0, "dropped": 0, "flushed": 0, "flushes": 0, "errors": 0}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+    
+    def track(self, user_id: int, user_role: str, startup_ids: List[int], metadata: Dict[str, Any]):
+        """Постановка просмотров в очередь (без обращения к БД)"""
+        now = datetime.utcnow()
+        for startup_id in startup_ids:
+            try:
+                self.queue.put_nowait({
+                    "event_type": "view",
+                    "user_id": user_id,
+                    "user_role": user_role,
+                    "startup_id": startup_id,
+                    "metadata": metadata,
+                    "created_at": now
+                })
+                self.stats["queued"] += 1
+            except asyncio.QueueFull:
+                # Очередь ограничена: при перегрузке теряем просмотры, а не память
+                self.stats["dropped"] += 1
+        
+        if self.queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+    
+    def start(self):
+        """Запуск фоновой задачи записи"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка фоновой задачи с записью оставшихся событий"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    async def flush(self):
+        """Запись всех накопленных событий пачками по batch_size"""
+        async with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+                if not batch:
+                    return
+                await self._write_batch(batch)
+    
+    async def _write_batch(self, batch: List[Dict[str, Any]]):
+        async with AsyncSessionLocal() as db:
+            try:
+                # Один bulk insert событий и по одному upsert на строку агрегатов
+                await track_analytics_events(db, batch)
+                
+                # Агрегированное увеличение счетчиков: одна строка на стартап,
+                # в порядке id чтобы параллельные сбросы не блокировали друг друга
+                views = Counter(event["startup_id"] for event in batch)
+                startups = Startup.__table__
+                await db.execute(
+                    update(startups)
+                    .where(startups.c.id == bindparam("b_startup_id"))
+                    # updated_at прежний: просмотры не меняют Last-Modified карточки (иначе onupdate)
+                    .values(
+                        views_count=func.coalesce(startups.c.views_count, 0) + bindparam("b_views"),
+                        updated_at=startups.c.updated_at
+                    ),
+                    [{"b_startup_id": startup_id, "b_views": count} for startup_id, count in sorted(views.items())]
+                )
+                await db.commit()
+                self.stats["flushed"] += len(batch)
+                self.stats["flushes"] += 1
+            except Exception as e:
+                print(f"Ошибка при записи просмотров: {e}")
+                await db.rollback()
+                self.stats["errors"] += 1
+
+view_tracker = ViewTracker(VIEW_BUFFER_MAX_SIZE, VIEW_FLUSH_BATCH_SIZE, VIEW_FLUSH_INTERVAL)
+
+def compute_startup_score(base_score: float, traction_score: Optional[float], likes_count: int, comments_count: int) -> float:
+    """Оценка из базового AI-анализа и текущей вовлеченности (не зависит от предыдущей оценки)"""
+    # Простая формула для демо (в реальном проекте сложнее)
+    engagement_score = min(100, ((likes_count or 0) * 5) + ((comments_count or 0) * 10))
+    return min(100, (engagement_score * 0.3) + ((traction_score or 0) * 0.4) + (base_score * 0.3))
+
+# Пересчет оценок: события по одному стартапу в пределах окна дают один пересчет
+class ScoreRecomputer:
+    """Отложенный пересчет AI оценок стартапов с пакетной записью в БД"""
+    
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pending = set()
+        self.stats = {"scheduled": 0, "coalesced": 0, "recomputed": 0, "updated": 0, "flushes": 0, "errors": 0}
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+    
+    def schedule(self, startup_id: int):
+        """Постановка стартапа на пересчет (без обращения к БД)"""
+        if startup_id in self.pending:
+            self.stats["coalesced"] += 1
+        self.pending.add(startup_id)
+        self.stats["scheduled"] += 1
+    
+    async def schedule_stale(self) -> int:
+        """Постановка на пересчет стартапов, изменившихся после последнего пересчета (очередь в памяти теряется при перезапуске)"""
+        async with AsyncSessionLocal() as db:
+            startup_ids = (await db.execute(
+                select(Startup.id).where(
+                    (Startup.score_updated_at.is_(None)) | (Startup.score_updated_at < Startup.updated_at)
+                )
+            )).scalars().all()
+        for startup_id in startup_ids:
+            self.schedule(startup_id)
+        return len(startup_ids)
+    
+    def start(self):
+        """Запуск фоновой задачи пересчета"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка фоновой задачи с пересчетом оставшихся стартапов"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+    
+    async def flush(self):
+        """Пересчет всех накопленных стартапов пачками по batch_size"""
+        async with self._flush_lock:
+            while self.pending:
+                batch = sorted(self.pending)[:self.batch_size]
+                self.pending.difference_update(batch)
+                if not await self._recompute(batch):
+                    return
+    
+    async def _recompute(self, startup_ids: List[int]) -> bool:
+        async with AsyncSessionLocal() as db:
+            try:
+                # Одна выборка на пачку: текущая вовлеченность и базовый AI-анализ (если он есть)
+                rows = (await db.execute(
+                    select(
+                        Startup.id, Startup.ai_score, Startup.category, Startup.stage, Startup.region,
+                        Startup.likes_count, Startup.comments_count, Startup.traction_score,
+                        func.coalesce(AIAnalysis.overall_score, SCORE_DEFAULT_BASE).label("base_score"),
+                        AIAnalysis.traction_score.label("base_traction_score")
+                    )
+                    .outerjoin(AIAnalysis, AIAnalysis.startup_id == Startup.id)
+                    .where(Startup.id.in_(startup_ids))
+                    .order_by(Startup.id)
+                )).all()
+                
+                changes = []
+                for row in rows:
+                    traction_score = row.base_traction_score if row.base_traction_score is not None else row.traction_score
+                    score = compute_startup_score(row.base_score, traction_score, row.likes_count, row.comments_count)
+                    if score != row.ai_score:
+                        changes.append((row, score))
+                
+                # Одно пакетное обновление в порядке id: оценка, версия и updated_at (тем же значением,
+                # иначе onupdate сделал бы стартап снова устаревшим) - у изменившихся, время пересчета - у всех
+                if rows:
+                    now = datetime.utcnow()
+                    changed = {row.id: score for row, score in changes}
+                    startups = Startup.__table__
+                    await db.execute(
+                        update(startups)
+                        .where(startups.c.id == bindparam("b_startup_id"))
+                        .values(
+                            ai_score=bindparam("b_score"),
+                            version=startups.c.version + bindparam("b_version_step"),
+                            score_updated_at=now,
+                            updated_at=case((bindparam("b_version_step") > 0, now), else_=startups.c.updated_at)
+                        ),
+                        [
+                            {
+                                "b_startup_id": row.id,
+                                "b_score": changed.get(row.id, row.ai_score),
+                                "b_version_step": 1 if row.id in changed else 0
+                            }
+                            for row in rows
+                        ]
+                    )
+                    await db.commit()
+                
+                # Страницы, где стартап был до пересчета или окажется после
+                for row, score in changes:
+                    invalidate_catalog_cache(row, scores=[row.ai_score, score])
+                
+                self.stats["recomputed"] += len(rows)
+                self.stats["updated"] += len(changes)
+                self.stats["flushes"] += 1
+                return True
+            except Exception as e:
+                print(f"Ошибка при пересчете оценок стартапов: {e}")
+                await db.rollback()
+                self.stats["errors"] += 1
+                # Пересчет идемпотентен - повторим при следующем сбросе
+                self.pending.update(startup_ids)
+                return False
+
+score_recomputer = ScoreRecomputer(SCORE_RECOMPUTE_INTERVAL, SCORE_RECOMPUTE_BATCH_SIZE)
+
+@app.on_event("startup")
+async def start_background_services():
+    view_tracker.start()
+    try:
+        await score_recomputer.schedule_stale()
+    except Exception as e:
+        print(f"Ошибка при поиске устаревших оценок стартапов: {e}")
+    score_recomputer.start()
+    try:
+        async with AsyncSessionLocal() as db:
+            await matching_index.build(db)
+    except Exception as e:
+        # Индекс будет построен при первом мэтчинге
+        print(f"Ошибка при построении индекса мэтчинга: {e}")
+    try:
+        async with AsyncSessionLocal() as db:
+            await similarity_index.build(db)
+    except Exception as e:
+        # Индекс будет построен при первом запросе похожих стартапов
+        print(f"Ошибка при построении индекса похожих стартапов: {e}")
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await view_tracker.stop()
+    await score_recomputer.stop()
 
 # ==================== API ЭНДПОИНТЫ ====================
 
@@ -366,11 +851,11 @@ async def root():
 
 # Аутентификация
 @app.post("/api/auth/register")
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Регистрация нового пользователя (этап 1)"""
     try:
         # Проверяем, существует ли пользователь
-        existing_user = db.query(User).filter(User.email == user_data.email).first()
+        existing_user = await db.scalar(select(User).where(User.email == user_data.email))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -401,8 +886,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
         
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         # Создаем токен
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -426,17 +911,17 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при регистрации: {str(e)}"
         )
 
 @app.post("/api/auth/login")
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Вход пользователя"""
     try:
-        user = db.query(User).filter(User.email == user_data.email).first()
+        user = await db.scalar(select(User).where(User.email == user_data.email))
         
         if not user or not verify_password(user_data.password, user.password_hash):
             raise HTTPException(
@@ -483,7 +968,7 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
 async def link_telegram_account(
     telegram_data: UserTelegramLink,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Привязка Telegram аккаунта к пользователю"""
     try:
@@ -495,10 +980,10 @@ async def link_telegram_account(
             )
         
         # Проверяем, не используется ли username другим пользователем
-        existing_user = db.query(User).filter(
+        existing_user = await db.scalar(select(User).where(
             User.telegram_username == telegram_data.telegram_username,
             User.id != current_user.id
-        ).first()
+        ))
         
         if existing_user:
             raise HTTPException(
@@ -508,7 +993,8 @@ async def link_telegram_account(
         
         # Сохраняем username (telegram_id будет установлен позже через бота)
         current_user.telegram_username = telegram_data.telegram_username
-        db.commit()
+        await db.commit()
+        invalidate_user(current_user.id)
         
         return {
             "message": "Telegram username сохранен. Перейдите в бота @YourStartupBot и отправьте /start для завершения привязки.",
@@ -518,7 +1004,7 @@ async def link_telegram_account(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при привязке Telegram: {str(e)}"
@@ -528,11 +1014,11 @@ async def link_telegram_account(
 async def confirm_telegram_link(
     telegram_id: str,
     telegram_username: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Подтверждение привязки Telegram через webhook от бота"""
     try:
-        user = db.query(User).filter(User.telegram_username == telegram_username).first()
+        user = await db.scalar(select(User).where(User.telegram_username == telegram_username))
         
         if not user:
             return JSONResponse(
@@ -543,7 +1029,8 @@ async def confirm_telegram_link(
         user.telegram_id = telegram_id
         user.telegram_linked = True
         user.telegram_linked_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        invalidate_user(user.id)
         
         # Отправляем приветственное уведомление
         TelegramService.send_notification(
@@ -551,15 +1038,64 @@ async def confirm_telegram_link(
             f"✅ Telegram успешно привязан к аккаунту {user.email}! Теперь вы будете получать уведомления о ваших стартапах.",
             db
         )
+        await db.commit()
         
         return {"message": "Telegram успешно привязан"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при подтверждении Telegram: {str(e)}"
         )
 
+# Профиль пользователя
+@app.put("/api/user/profile")
+async def update_profile(
+    profile_data: UserProfileUpdate,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Обновление профиля (интересы инвестора, специализации ментора и т.д.)"""
+    try:
+        user = await db.scalar(select(User).where(User.id == current_user.id))
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пользователь не найден"
+            )
+        
+        before = profile_snapshot(user)
+        changes = profile_data.dict(exclude_unset=True)
+        for field, value in changes.items():
+            setattr(user, field, value)
+        
+        # Имя владельца входит в детальные карточки его стартапов
+        if "name" in changes:
+            await db.execute(
+                update(Startup)
+                .where(Startup.owner_id == user.id)
+                .values(version=Startup.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+        
+        # Пересчет мэтчинга затронутых стартапов (python worker.py rematch)
+        rematch_job = rematch_job_for(user, before)
+        if rematch_job:
+            db.add(rematch_job)
+        await db.commit()
+        invalidate_user(user.id)
+        matching_index.update_user(user)
+        
+        return {"message": "Профиль обновлен", "user": user.to_dict()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при обновлении профиля: {str(e)}"
+        )
+
 # Стартапы
 @app.get("/api/startups")
 async def get_startups(
@@ -569,145 +1105,327 @@ async def get_startups(
     stage: Optional[str] = None,
     region: Optional[str] = None,
     min_score: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    include_viewer_state: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_principal)
 ):
-    """Получение списка стартапов с фильтрацией"""
+    """Получение списка стартапов с фильтрацией (пагинация через skip/limit или курсор)"""
     try:
-        query = db.query(Startup).filter(
-            Startup.is_published == True,
-            Startup.is_approved == True
-        )
+        # Ответ каталога одинаков для всех пользователей - отдаем из кэша
+        cache_key = (category, stage, region, min_score, skip, limit, cursor, include_total)
+        response = catalog_cache.get(cache_key)
+        if response is None:
+            response = await build_startups_page(db, skip, limit, category, stage, region, min_score, cursor, include_total)
+            catalog_cache.set(cache_key, response)
+        
+        # Состояние текущего пользователя - поверх общего ответа, кэшированный объект не меняем
+        if include_viewer_state and current_user:
+            like_state = await get_like_state(db, current_user.id, [startup["id"] for startup in response["startups"]])
+            response = {
+                **response,
+                "startups": [{**startup, "is_liked": like_state[startup["id"]]} for startup in response["startups"]]
+            }
+        
+        # Логируем просмотр если пользователь авторизован (запись в БД - пачками в фоне)
+        if current_user:
+            view_tracker.track(
+                current_user.id,
+                current_user.role,
+                [startup["id"] for startup in response["startups"]],
+                {"source": "catalog", "page": None if cursor else skip // limit + 1}
+            )
         
-        # Применяем фильтры
-        if category:
-            query = query.filter(Startup.category == category)
-        if stage:
-            query = query.filter(Startup.stage == stage)
-        if region:
-            query = query.filter(Startup.region == region)
-        if min_score:
-            query = query.filter(Startup.ai_score >= min_score)
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении стартапов: {str(e)}"
+        )
+
+async def build_startups_page(
+    db: AsyncSession,
+    skip: int,
+    limit: int,
+    category: Optional[str],
+    stage: Optional[str],
+    region: Optional[str],
+    min_score: Optional[int],
+    cursor: Optional[str],
+    include_total: bool
+) -> Dict[str, Any]:
+    """Выборка страницы каталога из БД"""
+    # Фильтры - в database.catalog_query, рядом с индексами, которые их обслуживают
+    query = catalog_query(category, stage, region, min_score)
+    
+    # Общее количество считаем только по запросу клиента
+    total = None
+    if include_total:
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    
+    # Сортировка по AI Score и дате (id - для однозначного порядка)
+    query = query.order_by(*CATALOG_ORDER)
+    
+    if cursor:
+        try:
+            cursor_score, cursor_created_at, cursor_id = decode_cursor(cursor, 3)
+            cursor_key = (
+                float(cursor_score),
+                datetime.fromisoformat(cursor_created_at),
+                int(cursor_id)
+            )
+        except (TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Некорректный курсор"
+            )
+        # Поиск по индексу вместо пропуска skip строк
+        query = query.where(
+            tuple_(Startup.ai_score, Startup.created_at, Startup.id) < cursor_key
+        )
+    else:
+        query = query.offset(skip)
+    
+    # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+    startups = (await db.scalars(query.limit(limit + 1))).all()
+    has_more = len(startups) > limit
+    startups = startups[:limit]
+    
+    next_cursor = None
+    if has_more and startups:
+        last = startups[-1]
+        next_cursor = encode_cursor([
+            last.ai_score,
+            last.created_at.isoformat() if last.created_at else None,
+            last.id
+        ])
+    
+    return {
+        "startups": [{
+            "id": s.id,
+            "name": s.name,
+            "short_description": s.short_description,
+            "stage": s.stage,
+            "category": s.category,
+            "ai_score": s.ai_score,
+            "views_count": s.views_count,
+            "likes_count": s.likes_count,
+            "region": s.region,
+            "created_at": s.created_at.isoformat() if s.created_at else None
+        } for s in startups],
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }
+
+# Объявлен до /api/startups/{startup_id}, иначе путь совпадет с ним
+@app.get("/api/startups/like-state")
+async def get_startups_like_state(
+    ids: List[int] = Query(...),
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Лайки текущего пользователя для страницы стартапов (?ids=1&ids=2...)"""
+    try:
+        startup_ids = list(dict.fromkeys(ids))
+        if len(startup_ids) > LIKE_STATE_MAX_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Не больше {LIKE_STATE_MAX_IDS} стартапов за запрос"
+            )
         
-        # Сортировка по AI Score и дате
-        query = query.order_by(desc(Startup.ai_score), desc(Startup.created_at))
+        return {"liked": await get_like_state(db, current_user.id, startup_ids)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении лайков: {str(e)}"
+        )
+
+# Лента "стартапы для меня"
+@app.get("/api/feed")
+async def get_feed(
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Подходящие стартапы для инвестора или ментора по убыванию оценки мэтчинга"""
+    try:
+        if current_user.role not in ["investor", "mentor"]:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Лента доступна только инвесторам и менторам"
+            )
         
-        total = query.count()
-        startups = query.offset(skip).limit(limit).all()
+        # Один запрос по индексу ленты; неопубликованные стартапы отсекаются соединением
+        query = (
+            select(MatchFeed.score, MatchFeed.breakdown, Startup)
+            .join(Startup, Startup.id == MatchFeed.startup_id)
+            .where(
+                MatchFeed.user_id == current_user.id,
+                Startup.is_published == True,
+                Startup.is_approved == True
+            )
+            .order_by(desc(MatchFeed.score), desc(MatchFeed.startup_id))
+        )
         
-        # Логируем просмотр если пользователь авторизован
-        if current_user:
-            for startup in startups:
-                event = AnalyticsEvent(
-                    event_type="view",
-                    user_id=current_user.id,
-                    user_role=current_user.role,
-                    startup_id=startup.id,
-                    metadata={"source": "catalog", "page": skip // limit + 1}
+        if cursor:
+            try:
+                cursor_score, cursor_id = decode_cursor(cursor, 2)
+                cursor_key = (float(cursor_score), int(cursor_id))
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Некорректный курсор"
                 )
-                db.add(event)
-                
-                # Увеличиваем счетчик просмотров
-                startup.views_count += 1
-            db.commit()
+            query = query.where(tuple_(MatchFeed.score, MatchFeed.startup_id) < cursor_key)
+        
+        rows = (await db.execute(query.limit(limit + 1))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        next_cursor = None
+        if has_more and rows:
+            next_cursor = encode_cursor([rows[-1].score, rows[-1].Startup.id])
         
         return {
             "startups": [{
-                "id": s.id,
-                "name": s.name,
-                "short_description": s.short_description,
-                "stage": s.stage,
-                "category": s.category,
-                "ai_score": s.ai_score,
-                "views_count": s.views_count,
-                "likes_count": s.likes_count,
-                "region": s.region,
-                "created_at": s.created_at.isoformat() if s.created_at else None
-            } for s in startups],
-            "total": total,
-            "skip": skip,
-            "limit": limit
+                "id": row.Startup.id,
+                "name": row.Startup.name,
+                "short_description": row.Startup.short_description,
+                "stage": row.Startup.stage,
+                "category": row.Startup.category,
+                "region": row.Startup.region,
+                "ai_score": row.Startup.ai_score,
+                "investment_asked": row.Startup.investment_asked,
+                "match_score": row.score,
+                "match_breakdown": row.breakdown
+            } for row in rows],
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Ошибка при получении стартапов: {str(e)}"
+            detail=f"Ошибка при получении ленты: {str(e)}"
         )
 
 @app.get("/api/startups/{startup_id}")
 async def get_startup(
     startup_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_principal)
 ):
-    """Получение детальной информации о стартапе"""
+    """Получение детальной информации о стартапе (ETag / Last-Modified, 304 без тела)"""
     try:
-        startup = db.query(Startup).filter(
-            Startup.id == startup_id,
-            Startup.is_published == True,
-            Startup.is_approved == True
-        ).first()
+        # Дешевая выборка по первичному ключу: версия решает, нужна ли карточка целиком
+        head = (await read_db.execute(
+            select(Startup.version, Startup.updated_at, Startup.views_count, Startup.owner_id, Startup.name)
+            .where(Startup.id == startup_id, CATALOG_VISIBLE)
+        )).first()
         
-        if not startup:
+        if not head:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Стартап не найден"
             )
         
-        # Логируем детальный просмотр если пользователь авторизован
+        # Детальный просмотр - через буфер просмотров, в том числе для ответов 304
         if current_user:
-            event = AnalyticsEvent(
-                event_type="view",
-                user_id=current_user.id,
-                user_role=current_user.role,
-                startup_id=startup.id,
-                metadata={"source": "detail_page", "user_role": current_user.role}
+            view_tracker.track(
+                current_user.id,
+                current_user.role,
+                [startup_id],
+                {"source": "detail_page", "user_role": current_user.role}
             )
-            db.add(event)
             
-            # Отправляем уведомление владельцу стартапа если просмотрел инвестор
-            if current_user.role == "investor" and startup.owner_id != current_user.id:
-                TelegramService.send_notification(
-                    startup.owner_id,
-                    f"👀 Инвестор {current_user.name} просмотрел ваш стартап '{startup.name}'",
-                    db
+        # Слабый ETag: счетчик просмотров меняется без смены версии
+        etag = f'W/"{startup_id}-{head.version}"'
+        last_modified = head.updated_at.replace(tzinfo=timezone.utc) if head.updated_at else None
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if last_modified:
+            headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+        
+        if is_not_modified(request, etag, last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        # Отправляем уведомление владельцу стартапа если просмотрел инвестор: не на ответы 304
+        # (повторная загрузка уже открытой карточки) и не чаще раза за окно на пару инвестор-стартап
+        notify_key = (current_user.id, startup_id) if current_user else None
+        if (
+            current_user and current_user.role == "investor" and head.owner_id != current_user.id
+            and investor_view_notified.get(notify_key) is None
+        ):
+            TelegramService.send_notification(
+                head.owner_id,
+                f"👀 Инвестор {current_user.name} просмотрел ваш стартап '{head.name}'",
+                db
+            )
+            await db.commit()
+            investor_view_notified.set(notify_key, True)
+        
+        cached = startup_detail_cache.get(startup_id)
+        if cached is not None and cached[0] == head.version:
+            detail = cached[1]
+        else:
+            startup = await read_db.scalar(
+                select(Startup)
+                .options(selectinload(Startup.owner))
+                .where(Startup.id == startup_id)
+            )
+            if not startup:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Стартап не найден"
                 )
-            
-            startup.views_count += 1
-            db.commit()
+            detail = {
+                "id": startup.id,
+                "name": startup.name,
+                "description": startup.description,
+                "short_description": startup.short_description,
+                "stage": startup.stage,
+                "category": startup.category,
+                "team_size": startup.team_size,
+                "project_cost": startup.project_cost,
+                "monthly_expenses": startup.monthly_expenses,
+                "investment_asked": startup.investment_asked,
+                "traction_metrics": startup.traction_metrics,
+                "market_size": startup.market_size,
+                "target_audience": startup.target_audience,
+                "region": startup.region,
+                "telegram_contact": startup.telegram_contact,
+                "website": startup.website,
+                "github": startup.github,
+                "contact_email": startup.contact_email,
+                "ai_score": startup.ai_score,
+                "investment_readiness": startup.investment_readiness,
+                "views_count": startup.views_count,
+                "likes_count": startup.likes_count,
+                "comments_count": startup.comments_count,
+                "owner_id": startup.owner_id,
+                "created_at": startup.created_at.isoformat() if startup.created_at else None,
+                "owner": {
+                    "id": startup.owner.id,
+                    "name": startup.owner.name,
+                    "role": startup.owner.role
+                } if startup.owner else None
+            }
+            # Версия - из той же строки, что и карточка
+            startup_detail_cache.set(startup_id, (startup.version, detail))
         
-        return {
-            "id": startup.id,
-            "name": startup.name,
-            "description": startup.description,
-            "short_description": startup.short_description,
-            "stage": startup.stage,
-            "category": startup.category,
-            "team_size": startup.team_size,
-            "project_cost": startup.project_cost,
-            "monthly_expenses": startup.monthly_expenses,
-            "investment_asked": startup.investment_asked,
-            "traction_metrics": startup.traction_metrics,
-            "market_size": startup.market_size,
-            "target_audience": startup.target_audience,
-            "region": startup.region,
-            "telegram_contact": startup.telegram_contact,
-            "website": startup.website,
-            "github": startup.github,
-            "contact_email": startup.contact_email,
-            "ai_score": startup.ai_score,
-            "investment_readiness": startup.investment_readiness,
-            "views_count": startup.views_count,
-            "likes_count": startup.likes_count,
-            "comments_count": startup.comments_count,
-            "owner_id": startup.owner_id,
-            "created_at": startup.created_at.isoformat() if startup.created_at else None,
-            "owner": {
-                "id": startup.owner.id,
-                "name": startup.owner.name,
-                "role": startup.owner.role
-            } if startup.owner else None
-        }
+        return JSONResponse({**detail, "views_count": head.views_count}, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -716,55 +1434,100 @@ async def get_startup(
             detail=f"Ошибка при получении стартапа: {str(e)}"
         )
 
-# Функция для фоновой задачи
-def run_startup_matching(startup_id: int, db: Session):
-    """Запуск мэтчинга стартапа с инвесторами и менторами"""
+@app.get("/api/startups/{startup_id}/similar")
+async def get_similar_startups(
+    startup_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Похожие стартапы по тексту описания (TF-IDF, косинусная близость)"""
     try:
-        # Создаем новую сессию для фоновой задачи
-        from database import SessionLocal
-        local_db = SessionLocal()
+        startup = await db.scalar(
+            select(Startup).where(Startup.id == startup_id, CATALOG_VISIBLE)
+        )
         
-        try:
-            ai_record = local_db.query(AIAnalysis).filter(AIAnalysis.startup_id == startup_id).first()
-            if not ai_record:
-                return
-            
-            # Мэтчинг с инвесторами
-            matched_investors = AIService.match_startup_to_investors(startup_id, local_db)
-            ai_record.matched_investors = matched_investors
-            
-            # Мэтчинг с менторами
-            matched_mentors = AIService.match_startup_to_mentors(startup_id, local_db)
-            ai_record.matched_mentors = matched_mentors
+        if not startup:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Стартап не найден"
+            )
+        
+        await similarity_index.ensure_fresh(db)
+        neighbours = similarity_index.similar(startup, k=limit)
+        
+        # Индекс мог устареть: скрытые с момента перестройки стартапы отсекаются запросом
+        startups = {}
+        if neighbours:
+            startups = {
+                item.id: item for item in (await db.scalars(
+                    select(Startup).where(
+                        Startup.id.in_([neighbour_id for neighbour_id, _ in neighbours]),
+                        CATALOG_VISIBLE
+                    )
+                )).all()
+            }
+        
+        return {
+            "startup_id": startup_id,
+            "similar": [{
+                "id": item.id,
+                "name": item.name,
+                "short_description": item.short_description,
+                "stage": item.stage,
+                "category": item.category,
+                "region": item.region,
+                "ai_score": item.ai_score,
+                "similarity": similarity
+            } for item, similarity in (
+                (startups[neighbour_id], similarity)
+                for neighbour_id, similarity in neighbours
+                if neighbour_id in startups
+            )]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при поиске похожих стартапов: {str(e)}"
+        )
+
+# Фоновое задание "startup_matching" (выполняет воркер: python worker.py jobs)
+async def run_startup_matching(startup_id: int):
+    """Запуск мэтчинга стартапа с инвесторами и менторами; исключение - задание будет повторено"""
+    async with AsyncSessionLocal() as local_db:
+        ai_record = await local_db.scalar(select(AIAnalysis).where(AIAnalysis.startup_id == startup_id))
+        if not ai_record:
+            return
             
-            # Сохраняем причины мэтчинга
-            startup = local_db.query(Startup).filter(Startup.id == startup_id).first()
-            if startup:
-                ai_record.match_reasons = {
-                    "investors": f"Соответствие категории {startup.category} и региона {startup.region}",
-                    "mentors": f"Специализация в {startup.category} и стадии {startup.stage}"
-                }
+        # Мэтчинг с инвесторами и менторами (списки отсортированы по оценке); ошибка индекса
+        # или запроса уходит в очередь заданий - прежние результаты и лента не трогаются
+        investor_matches = await AIService.match_startup_to_investors(startup_id, local_db)
+        mentor_matches = await AIService.match_startup_to_mentors(startup_id, local_db)
+        ai_record.matched_investors = [match["id"] for match in investor_matches]
+        ai_record.matched_mentors = [match["id"] for match in mentor_matches]
             
-            local_db.commit()
+        # Сохраняем оценки и их разбивку по признакам, обновляем ленты пользователей
+        ai_record.match_reasons = {"investors": investor_matches, "mentors": mentor_matches}
+        await replace_match_feed(local_db, startup_id, {"investor": investor_matches, "mentor": mentor_matches})
             
-            # Отправляем уведомления подходящим инвесторам
-            for investor_id in matched_investors[:5]:  # Ограничиваем 5 уведомлениями
+        startup = await local_db.scalar(select(Startup).where(Startup.id == startup_id))
+        if startup:
+            # Уведомляем лучших по оценке инвесторов (outbox, в той же транзакции)
+            for investor_id in ai_record.matched_investors[:5]:  # Ограничиваем 5 уведомлениями
                 TelegramService.send_notification(
                     investor_id,
                     f"🎯 Найден подходящий стартап для вас: '{startup.name}' ({startup.category}, оценка AI: {startup.ai_score:.1f}/100)",
                     local_db
                 )
-        finally:
-            local_db.close()
-    except Exception as e:
-        print(f"Ошибка при мэтчинге стартапа {startup_id}: {e}")
+            
+        await local_db.commit()
 
 @app.post("/api/startups")
 async def create_startup(
     startup_data: StartupCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    backgroundtasks: BackgroundTasks = Depends(get_background_tasks)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создание нового стартапа"""
     try:
@@ -786,12 +1549,15 @@ async def create_startup(
         ai_analysis = AIService.analyze_startup(startup_data.dict())
         
         # Создаем стартап
+        now = datetime.utcnow()
         startup = Startup(
             **startup_data.dict(),
             owner_id=current_user.id,
             ai_score=ai_analysis["overall_score"],
             investment_readiness=ai_analysis["investment_readiness"],
-            created_at=datetime.utcnow(),
+            created_at=now,
+            updated_at=now,
+            score_updated_at=now,
             is_published=False,  # Не публикуем сразу, нужна модерация
             is_approved=False,
             views_count=0,
@@ -800,8 +1566,8 @@ async def create_startup(
         )
         
         db.add(startup)
-        db.commit()
-        db.refresh(startup)
+        await db.commit()
+        await db.refresh(startup)
         
         # Сохраняем AI анализ
         ai_record = AIAnalysis(
@@ -818,18 +1584,22 @@ async def create_startup(
             created_at=datetime.utcnow()
         )
         db.add(ai_record)
-        db.commit()
-        
-        # Запускаем мэтчинг в фоне
-        background_tasks.add_task(run_startup_matching, startup.id)
         
-        # Отправляем уведомление владельцу
+        # Уведомление владельцу уходит в outbox вместе с AI анализом
         TelegramService.send_notification(
             current_user.id,
             f"✅ Ваш стартап '{startup.name}' успешно создан! AI оценка: {ai_analysis['overall_score']:.1f}/100. Проект отправлен на модерацию.",
             db
         )
         
+        # Мэтчинг - задание в очереди, в той же транзакции (не теряется при рестарте)
+        await enqueue_job(db, "startup_matching", {"startup_id": startup.id}, dedup_key=str(startup.id))
+        await db.commit()
+        
+        # Новый стартап уходит на модерацию; в каталоге он появится только после одобрения
+        if startup.is_published and startup.is_approved:
+            invalidate_catalog_cache(startup)
+        
         return {
             "message": "Стартап успешно создан и отправлен на модерацию",
             "startup": {
@@ -845,10 +1615,10 @@ async def create_startup(
             "ai_analysis": ai_analysis
         }
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при создании стартапа: {str(e)}"
@@ -858,12 +1628,12 @@ async def create_startup(
 @app.post("/api/startups/{startup_id}/like")
 async def like_startup(
     startup_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Поставить/убрать лайк стартапу"""
     try:
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
         
         if not startup:
             raise HTTPException(
@@ -872,32 +1642,32 @@ async def like_startup(
             )
         
         # Проверяем, не лайкнул ли уже пользователь
-        existing_like = db.query(Like).filter(
+        existing_like = await db.scalar(select(Like).where(
             Like.user_id == current_user.id,
             Like.startup_id == startup_id
-        ).first()
+        ))
         
         if existing_like:
-            # Убираем лайк
-            db.delete(existing_like)
-            startup.likes_count = max(0, startup.likes_count - 1)
+            # Убираем лайк; счетчик уменьшается, только если лайк удалил именно этот запрос
+            removed = await db.execute(delete(Like).where(Like.id == existing_like.id))
+            delta = -removed.rowcount
             action = "unliked"
         else:
-            # Ставим лайк
+            # Ставим лайк (повторный параллельный лайк отклонит уникальный индекс)
             like = Like(user_id=current_user.id, startup_id=startup_id)
             db.add(like)
-            startup.likes_count += 1
+            await db.flush()
+            delta = 1
             action = "liked"
             
             # Логируем событие
-            event = AnalyticsEvent(
-                event_type="like",
-                user_id=current_user.id,
-                user_role=current_user.role,
-                startup_id=startup_id,
-                metadata={"action": "like"}
-            )
-            db.add(event)
+            await track_analytics_events(db, [{
+                "event_type": "like",
+                "user_id": current_user.id,
+                "user_role": current_user.role,
+                "startup_id": startup_id,
+                "metadata": {"action": "like"}
+            }])
             
             # Отправляем уведомление владельцу если лайкнул инвестор
             if current_user.role == "investor" and startup.owner_id != current_user.id:
@@ -907,78 +1677,101 @@ async def like_startup(
                     db
                 )
         
-        db.commit()
+        # Атомарное приращение в базе вместо чтения-изменения-записи строки стартапа
+        if delta:
+            await increment_startup_counters(db, startup_id, counter_shards(startup), likes_count=delta)
         
-        # Пересчитываем AI score
-        update_startup_score(startup_id, db)
+        await db.commit()
+        invalidate_catalog_cache(startup)
+        update_like_state(current_user.id, startup_id, action == "liked")
         
-        return {"action": action, "likes_count": startup.likes_count}
+        # AI score пересчитывается в фоне (повторные лайки в пределах окна - один пересчет)
+        score_recomputer.schedule(startup_id)
+        
+        return {"action": action, "likes_count": max(0, (startup.likes_count or 0) + delta)}
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при обработке лайка: {str(e)}"
         )
 
-def update_startup_score(startup_id: int, db: Session):
-    """Обновление AI оценки стартапа на основе новых данных"""
-    try:
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
-        if not startup:
-            return
-        
-        # Простая формула для демо (в реальном проекте сложнее)
-        engagement_score = min(100, (startup.likes_count * 5) + (startup.comments_count * 10))
-        traction_score = startup.traction_score or 0
-        new_score = (engagement_score * 0.3) + (traction_score * 0.4) + (startup.ai_score * 0.3)
-        
-        startup.ai_score = min(100, new_score)
-        
-        # Обновляем AI анализ
-        ai_record = db.query(AIAnalysis).filter(AIAnalysis.startup_id == startup_id).first()
-        if ai_record:
-            ai_record.overall_score = startup.ai_score
-            ai_record.updated_at = datetime.utcnow()
-        
-        db.commit()
-    except Exception as e:
-        print(f"Ошибка при обновлении оценки стартапа {startup_id}: {e}")
-        db.rollback()
-
 # Комментарии
 @app.get("/api/startups/{startup_id}/comments")
 async def get_comments(
     startup_id: int,
     skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получение публичных комментариев к стартапу"""
+    """Получение публичных комментариев к стартапу (пагинация через skip/limit или курсор)"""
     try:
-        comments = db.query(Comment).filter(
-            Comment.startup_id == startup_id,
-            Comment.is_public == True
-        ).order_by(desc(Comment.created_at)).offset(skip).limit(limit).all()
+        # Автор - в том же запросе через JOIN, только нужные колонки
+        query = (
+            select(
+                Comment.id, Comment.content, Comment.created_at,
+                User.name.label("author_name"), User.role.label("author_role")
+            )
+            .join(User, User.id == Comment.author_id)
+            .where(
+                Comment.startup_id == startup_id,
+                Comment.is_public == True
+            )
+            # По индексу ix_comments_startup_public_created (id - для однозначного порядка)
+            .order_by(desc(Comment.created_at), desc(Comment.id))
+        )
+        
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor, 2)
+                cursor_key = (datetime.fromisoformat(cursor_created_at), int(cursor_id))
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Некорректный курсор"
+                )
+            query = query.where(tuple_(Comment.created_at, Comment.id) < cursor_key)
+        else:
+            query = query.offset(skip)
+        
+        comments = (await db.execute(query.limit(limit + 1))).all()
+        has_more = len(comments) > limit
+        comments = comments[:limit]
+        
+        next_cursor = None
+        if has_more and comments:
+            last = comments[-1]
+            next_cursor = encode_cursor([last.created_at.isoformat(), last.id])
+        
+        # Общее количество - поддерживаемый счетчик стартапа вместо COUNT(*) по комментариям.
+        # Это оценка, а не COUNT с фильтром страницы: счетчик учитывает и непубличные комментарии
+        # (API создает только публичные), а у горячих стартапов отстает на интервал сворачивания
+        # слотов (COUNTER_FOLD_INTERVAL). Конец списка определяют has_more/next_cursor, не total
+        total = await db.scalar(select(Startup.comments_count).where(Startup.id == startup_id))
         
         return {
             "comments": [
                 {
                     "id": comment.id,
                     "content": comment.content,
-                    "author_name": comment.author.name,
-                    "author_role": comment.author.role,
+                    "author_name": comment.author_name,
+                    "author_role": comment.author_role,
                     "created_at": comment.created_at.isoformat() if comment.created_at else None
                 }
                 for comment in comments
             ],
-            "total": db.query(Comment).filter(
-                Comment.startup_id == startup_id, 
-                Comment.is_public == True
-            ).count()
+            "total": total or 0,
+            "skip": skip,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -989,12 +1782,12 @@ async def get_comments(
 async def create_comment(
     startup_id: int,
     comment_data: CommentCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создание публичного комментария"""
     try:
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
         
         if not startup:
             raise HTTPException(
@@ -1011,17 +1804,16 @@ async def create_comment(
         )
         
         db.add(comment)
-        startup.comments_count += 1
+        await increment_startup_counters(db, startup_id, counter_shards(startup), comments_count=1)
         
         # Логируем событие
-        event = AnalyticsEvent(
-            event_type="comment",
-            user_id=current_user.id,
-            user_role=current_user.role,
-            startup_id=startup_id,
-            metadata={"comment_length": len(comment_data.content)}
-        )
-        db.add(event)
+        await track_analytics_events(db, [{
+            "event_type": "comment",
+            "user_id": current_user.id,
+            "user_role": current_user.role,
+            "startup_id": startup_id,
+            "metadata": {"comment_length": len(comment_data.content)}
+        }])
         
         # Отправляем уведомление владельцу
         if startup.owner_id != current_user.id:
@@ -1031,10 +1823,10 @@ async def create_comment(
                 db
             )
         
-        db.commit()
+        await db.commit()
         
-        # Пересчитываем AI score
-        update_startup_score(startup_id, db)
+        # AI score пересчитывается в фоне
+        score_recomputer.schedule(startup_id)
         
         return {
             "message": "Комментарий успешно добавлен",
@@ -1046,10 +1838,10 @@ async def create_comment(
             }
         }
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при создании комментария: {str(e)}"
@@ -1059,12 +1851,14 @@ async def create_comment(
 @app.post("/api/startups/{startup_id}/contact")
 async def contact_startup_owner(
     startup_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Инициация контакта с владельцем стартапа через Telegram"""
     try:
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
+        startup = await db.scalar(
+            select(Startup).options(selectinload(Startup.owner)).where(Startup.id == startup_id)
+        )
         
         if not startup:
             raise HTTPException(
@@ -1086,7 +1880,7 @@ async def contact_startup_owner(
             )
         
         # Инициируем контакт через Telegram
-        success = TelegramService.initiate_contact(
+        success = await TelegramService.initiate_contact(
             user_id=current_user.id,
             target_user_id=startup.owner_id,
             startup_id=startup_id,
@@ -1100,25 +1894,24 @@ async def contact_startup_owner(
             )
         
         # Логируем событие
-        event = AnalyticsEvent(
-            event_type="contact_click",
-            user_id=current_user.id,
-            user_role=current_user.role,
-            startup_id=startup_id,
-            metadata={"action": "telegram_contact_initiated"}
-        )
-        db.add(event)
-        db.commit()
+        await track_analytics_events(db, [{
+            "event_type": "contact_click",
+            "user_id": current_user.id,
+            "user_role": current_user.role,
+            "startup_id": startup_id,
+            "metadata": {"action": "telegram_contact_initiated"}
+        }])
+        await db.commit()
         
         return {
             "message": "Контакт инициирован. Проверьте ваш Telegram для дальнейшего общения.",
             "telegram_contact": startup.telegram_contact
         }
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при инициации контакта: {str(e)}"
@@ -1128,38 +1921,57 @@ async def contact_startup_owner(
 @app.get("/api/mentors")
 async def get_mentors(
     skip: int = 0,
-    limit: int = 12,
+    limit: int = Query(12, ge=1, le=100),
     specialty: Optional[str] = None,
     min_experience: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получение списка менторов"""
+    """Получение списка менторов (пагинация через skip/limit или курсор)"""
     try:
-        query = db.query(User).filter(
+        query = select(User).where(
             User.role == "mentor",
             User.is_active == True,
             User.mentor_availability == True
         )
         
         if specialty:
-            # Простая фильтрация для совместимости
-            mentors = query.all()
-            filtered_mentors = []
-            for mentor in mentors:
-                if (mentor.mentor_specialties and 
-                    specialty in mentor.mentor_specialties):
-                    filtered_mentors.append(mentor)
-            mentors = filtered_mentors
-        else:
-            mentors = query.all()
-        
+            # Фильтр по специализации в базе (JSONB @> на Postgres)
+            query = query.where(json_contains(User.mentor_specialties, specialty))
         if min_experience:
-            mentors = [m for m in mentors if m.mentor_experience >= min_experience]
+            # Ментор без указанного опыта считается с опытом 0
+            query = query.where(MENTOR_EXPERIENCE >= min_experience)
+        
+        # Общее количество - только по запросу клиента, без загрузки строк
+        total = None
+        if include_total:
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        
+        # Сортировка по опыту (id - для однозначного порядка), по индексу ix_users_mentor_catalog
+        query = query.order_by(desc(MENTOR_EXPERIENCE), desc(User.id))
+        
+        if cursor:
+            try:
+                cursor_experience, cursor_id = decode_cursor(cursor, 2)
+                cursor_key = (int(cursor_experience), int(cursor_id))
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Некорректный курсор"
+                )
+            query = query.where(tuple_(MENTOR_EXPERIENCE, User.id) < cursor_key)
+        else:
+            query = query.offset(skip)
         
-        # Сортируем по опыту
-        mentors.sort(key=lambda x: x.mentor_experience or 0, reverse=True)
+        mentors = (await db.scalars(query.limit(limit + 1))).all()
+        has_more = len(mentors) > limit
+        paginated_mentors = mentors[:limit]
         
-        paginated_mentors = mentors[skip:skip + limit]
+        next_cursor = None
+        if has_more and paginated_mentors:
+            last = paginated_mentors[-1]
+            next_cursor = encode_cursor([last.mentor_experience or 0, last.id])
         
         return {
             "mentors": [
@@ -1174,10 +1986,14 @@ async def get_mentors(
                 }
                 for mentor in paginated_mentors
             ],
-            "total": len(mentors),
+            "total": total,
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "has_more": has_more
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1187,17 +2003,17 @@ async def get_mentors(
 @app.post("/api/mentorship/request")
 async def create_mentorship_request(
     request_data: MentorshipRequestCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Создание запроса на менторство"""
     try:
         # Проверяем, что целевой пользователь - ментор
-        mentor = db.query(User).filter(
+        mentor = await db.scalar(select(User).where(
             User.id == request_data.mentor_id,
             User.role == "mentor",
             User.is_active == True
-        ).first()
+        ))
         
         if not mentor:
             raise HTTPException(
@@ -1219,11 +2035,11 @@ async def create_mentorship_request(
             )
         
         # Проверяем, нет ли уже активного запроса
-        existing_request = db.query(MentorshipRequest).filter(
+        existing_request = await db.scalar(select(MentorshipRequest).where(
             MentorshipRequest.mentee_id == current_user.id,
             MentorshipRequest.mentor_id == request_data.mentor_id,
             MentorshipRequest.status.in_(["pending", "accepted"])
-        ).first()
+        ))
         
         if existing_request:
             raise HTTPException(
@@ -1244,11 +2060,9 @@ async def create_mentorship_request(
         )
         
         db.add(mentorship_request)
-        db.commit()
-        db.refresh(mentorship_request)
         
-        # Отправляем уведомление ментору
-        startup = db.query(Startup).filter(Startup.id == request_data.startup_id).first() if request_data.startup_id else None
+        # Уведомление ментору - в той же транзакции, что и запрос
+        startup = await db.scalar(select(Startup).where(Startup.id == request_data.startup_id)) if request_data.startup_id else None
         startup_name = startup.name if startup else "проекту"
         
         TelegramService.send_notification(
@@ -1256,9 +2070,12 @@ async def create_mentorship_request(
             f"👥 Пользователь {current_user.name} отправил вам запрос на менторство по стартапу '{startup_name}'. Проверьте заявку в личном кабинете.",
             db
         )
+        await db.commit()
+        # id - до initiate_contact: его откат при ошибке сбрасывает загруженные атрибуты
+        request_id = mentorship_request.id
         
         # Инициируем Telegram контакт
-        TelegramService.initiate_contact(
+        await TelegramService.initiate_contact(
             user_id=current_user.id,
             target_user_id=request_data.mentor_id,
             startup_id=request_data.startup_id,
@@ -1267,28 +2084,149 @@ async def create_mentorship_request(
         
         return {
             "message": "Запрос на менторство успешно отправлен",
-            "request_id": mentorship_request.id
+            "request_id": request_id
         }
     except HTTPException:
-        db.rollback()
+        await db.rollback()
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при создании запроса на менторство: {str(e)}"
         )
 
 # Аналитика
+def align_bucket(moment: datetime, granularity: str) -> datetime:
+    """Начало интервала, содержащего moment (недели - с понедельника)"""
+    if granularity == "week":
+        return truncate_time(moment, "day") - timedelta(days=moment.weekday())
+    return truncate_time(moment, granularity)
+
+def build_time_series(rows, start: datetime, step: timedelta, points: int, event_types: List[str]) -> Dict[str, Any]:
+    """Плотные ряды по типам событий и ролям из агрегатов: пустые интервалы заполняются нулями"""
+    step64 = np.timedelta64(int(step.total_seconds()), "s")
+    grid = np.datetime64(start, "s") + np.arange(points) * step64
+    series = {event_type: {"total": np.zeros(points, dtype=np.int64), "by_role": {}} for event_type in event_types}
+    
+    if rows:
+        types, roles, buckets, counts = zip(*rows)
+        # Номер интервала для каждой строки агрегата (суточные строки недели попадают в один интервал);
+        # смещение в секундах быстрее преобразования datetime -> datetime64
+        offsets = np.fromiter(((bucket - start).total_seconds() for bucket in buckets), dtype=np.int64, count=len(buckets))
+        positions = offsets // int(step.total_seconds())
+        # Роль None и "" - одна серия "unknown" (str(None) дало бы отдельную серию "None")
+        roles = [role or "" for role in roles]
+        keys = np.char.add(np.char.add(np.array(types, dtype=str), "|"), np.array(roles, dtype=str))
+        labels, series_index = np.unique(keys, return_inverse=True)
+        inside = (positions >= 0) & (positions < points)
+        
+        matrix = np.zeros((len(labels), points), dtype=np.int64)
+        np.add.at(matrix, (series_index[inside], positions[inside]), np.array(counts, dtype=np.int64)[inside])
+        
+        for label, values in zip(labels.tolist(), matrix):
+            event_type, user_role = label.split("|")
+            series[event_type]["total"] += values
+            series[event_type]["by_role"][user_role or "unknown"] = values.tolist()
+    
+    return {
+        "buckets": np.datetime_as_string(grid, unit="s").tolist(),
+        "series": {
+            event_type: {"total": data["total"].tolist(), "by_role": data["by_role"]}
+            for event_type, data in series.items()
+        }
+    }
+
+@app.get("/api/analytics/startup/{startup_id}/timeseries")
+async def get_startup_timeseries(
+    startup_id: int,
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    granularity: str = Query("day", regex="^(hour|day|week)$"),
+    event_type: Optional[str] = None,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Временные ряды событий стартапа по интервалам (час, день, неделя) с разбивкой по ролям"""
+    try:
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
+        
+        if not startup:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Стартап не найден"
+            )
+        
+        # Проверяем права доступа
+        if current_user.id != startup.owner_id and current_user.role != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Нет прав для просмотра аналитики"
+            )
+        
+        if event_type and event_type not in TIMESERIES_EVENT_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Неизвестный тип события, допустимые: {', '.join(TIMESERIES_EVENT_TYPES)}"
+            )
+        event_types = [event_type] if event_type else TIMESERIES_EVENT_TYPES
+        
+        # Границы периода в UTC, выровненные по интервалам; to входит в период
+        to = (to.astimezone(timezone.utc).replace(tzinfo=None) if to and to.tzinfo else to) or datetime.utcnow()
+        from_ = from_.astimezone(timezone.utc).replace(tzinfo=None) if from_ and from_.tzinfo else from_
+        from_ = from_ or to - TIMESERIES_DEFAULT_RANGES[granularity]
+        step = TIMESERIES_STEPS[granularity]
+        start = align_bucket(from_, granularity)
+        end = align_bucket(to, granularity) + step
+        points = (end - start) // step
+        
+        if from_ > to:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Начало периода позже его конца"
+            )
+        if points > TIMESERIES_MAX_POINTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Слишком много интервалов ({points}), максимум {TIMESERIES_MAX_POINTS}: сократите период или укрупните интервал"
+            )
+        
+        # Часовые ряды - из почасовых агрегатов, дневные и недельные - из суточных
+        rollup = AnalyticsRollupHourly if granularity == "hour" else AnalyticsRollupDaily
+        rows = (await db.execute(
+            select(rollup.event_type, rollup.user_role, rollup.bucket, rollup.count)
+            .where(
+                rollup.startup_id == startup_id,
+                rollup.bucket >= start,
+                rollup.bucket < end,
+                rollup.event_type.in_(event_types)
+            )
+        )).all()
+        
+        return {
+            "startup_id": startup_id,
+            "granularity": granularity,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            **build_time_series(rows, start, step, points, event_types)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при получении временных рядов: {str(e)}"
+        )
+
 @app.get("/api/analytics/startup/{startup_id}")
 async def get_startup_analytics(
     startup_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получение аналитики по стартапу"""
     try:
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
         
         if not startup:
             raise HTTPException(
@@ -1303,26 +2241,37 @@ async def get_startup_analytics(
                 detail="Нет прав для просмотра аналитики"
             )
         
-        # Получаем события аналитики
-        events = db.query(AnalyticsEvent).filter(
-            AnalyticsEvent.startup_id == startup_id
-        ).order_by(desc(AnalyticsEvent.created_at)).limit(100).all()
+        # Итоги по ролям - из суточных агрегатов (десятки строк вместо всех событий стартапа)
+        totals = (await db.execute(
+            select(AnalyticsRollupDaily.event_type, AnalyticsRollupDaily.user_role, func.sum(AnalyticsRollupDaily.count))
+            .where(
+                AnalyticsRollupDaily.startup_id == startup_id,
+                AnalyticsRollupDaily.event_type.in_(["view", "like", "contact_click"])
+            )
+            .group_by(AnalyticsRollupDaily.event_type, AnalyticsRollupDaily.user_role)
+        )).all()
         
-        # Агрегируем данные
         views_by_role = {}
         likes_by_role = {}
         contact_clicks = 0
         
-        for event in events:
-            if event.event_type == "view":
-                views_by_role[event.user_role] = views_by_role.get(event.user_role, 0) + 1
-            elif event.event_type == "like":
-                likes_by_role[event.user_role] = likes_by_role.get(event.user_role, 0) + 1
-            elif event.event_type == "contact_click":
-                contact_clicks += 1
+        for event_type, user_role, count in totals:
+            if event_type == "view":
+                views_by_role[user_role or None] = int(count)
+            elif event_type == "like":
+                likes_by_role[user_role or None] = int(count)
+            elif event_type == "contact_click":
+                contact_clicks += int(count)
+        
+        # Последние события для ленты активности
+        events = (await db.scalars(
+            select(AnalyticsEvent)
+            .where(AnalyticsEvent.startup_id == startup_id)
+            .order_by(desc(AnalyticsEvent.created_at)).limit(20)
+        )).all()
         
         # Получаем AI анализ
-        ai_analysis = db.query(AIAnalysis).filter(AIAnalysis.startup_id == startup_id).first()
+        ai_analysis = await db.scalar(select(AIAnalysis).where(AIAnalysis.startup_id == startup_id))
         
         return {
             "startup": {
@@ -1357,9 +2306,9 @@ async def get_startup_analytics(
                     "type": event.event_type,
                     "user_role": event.user_role,
                     "timestamp": event.created_at.isoformat() if event.created_at else None,
-                    "metadata": event.metadata
+                    "metadata": event.metadata_
                 }
-                for event in events[:20]
+                for event in events
             ]
         }
     except HTTPException:
@@ -1374,12 +2323,12 @@ async def get_startup_analytics(
 @app.get("/api/ai/matching/startup/{startup_id}")
 async def get_startup_matches(
     startup_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получение AI-мэтчинга для стартапа"""
     try:
-        startup = db.query(Startup).filter(Startup.id == startup_id).first()
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
         
         if not startup:
             raise HTTPException(
@@ -1394,16 +2343,27 @@ async def get_startup_matches(
                 detail="Нет прав для просмотра мэтчинга"
             )
         
-        ai_analysis = db.query(AIAnalysis).filter(AIAnalysis.startup_id == startup_id).first()
+        ai_analysis = await db.scalar(select(AIAnalysis).where(AIAnalysis.startup_id == startup_id))
         if not ai_analysis:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="AI анализ не найден"
             )
         
-        # Получаем детальную информацию о подобранных инвесторах и менторах
-        matched_investors = db.query(User).filter(User.id.in_(ai_analysis.matched_investors or [])).all()
-        matched_mentors = db.query(User).filter(User.id.in_(ai_analysis.matched_mentors or [])).all()
+        # Получаем детальную информацию о подобранных инвесторах и менторах (в порядке оценки)
+        investor_ids = ai_analysis.matched_investors or []
+        mentor_ids = ai_analysis.matched_mentors or []
+        matched_investors = (await db.scalars(select(User).where(User.id.in_(investor_ids)))).all()
+        matched_mentors = (await db.scalars(select(User).where(User.id.in_(mentor_ids)))).all()
+        matched_investors.sort(key=lambda user: investor_ids.index(user.id))
+        matched_mentors.sort(key=lambda user: mentor_ids.index(user.id))
+        
+        # Оценки из разбивки мэтчинга (в старых записях match_reasons - строки)
+        reasons = ai_analysis.match_reasons if isinstance(ai_analysis.match_reasons, dict) else {}
+        scores = {
+            role: {match["id"]: match["score"] for match in reasons.get(role) or [] if isinstance(match, dict)}
+            for role in ("investors", "mentors")
+        }
         
         return {
             "startup": {
@@ -1421,7 +2381,8 @@ async def get_startup_matches(
                         "name": investor.name,
                         "interests": investor.investment_interests,
                         "investment_range": investor.investment_range,
-                        "telegram_username": investor.telegram_username
+                        "telegram_username": investor.telegram_username,
+                        "match_score": scores["investors"].get(investor.id)
                     }
                     for investor in matched_investors
                 ],
@@ -1431,7 +2392,8 @@ async def get_startup_matches(
                         "name": mentor.name,
                         "specialties": mentor.mentor_specialties,
                         "experience": mentor.mentor_experience,
-                        "telegram_username": mentor.telegram_username
+                        "telegram_username": mentor.telegram_username,
+                        "match_score": scores["mentors"].get(mentor.id)
                     }
                     for mentor in matched_mentors
                 ]
@@ -1451,11 +2413,95 @@ async def get_startup_matches(
             detail=f"Ошибка при получении мэтчинга: {str(e)}"
         )
 
+# Администрирование
+@app.post("/api/admin/users/{user_id}/deactivate")
+async def deactivate_user(
+    user_id: int,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Деактивация аккаунта пользователя"""
+    try:
+        if current_user.role != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Недостаточно прав"
+            )
+        
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пользователь не найден"
+            )
+        
+        before = profile_snapshot(user)
+        user.is_active = False
+        rematch_job = rematch_job_for(user, before)
+        if rematch_job:
+            db.add(rematch_job)
+        await db.commit()
+        invalidate_user(user.id)
+        matching_index.remove_user(user.id)
+        
+        return {"message": "Аккаунт деактивирован", "user_id": user.id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при деактивации аккаунта: {str(e)}"
+        )
+
+@app.post("/api/admin/startups/{startup_id}/approve")
+async def approve_startup(
+    startup_id: int,
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Одобрение и публикация стартапа после модерации"""
+    try:
+        if current_user.role != "admin":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Недостаточно прав"
+            )
+        
+        startup = await db.scalar(select(Startup).where(Startup.id == startup_id))
+        if not startup:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Стартап не найден"
+            )
+        
+        # Одним UPDATE; загруженный объект получает новые значения (evaluate)
+        await db.execute(
+            update(Startup)
+            .where(Startup.id == startup_id)
+            .values(is_published=True, is_approved=True, version=Startup.version + 1)
+            .execution_options(synchronize_session="evaluate")
+        )
+        await db.commit()
+        invalidate_catalog_cache(startup)
+        # Другие процессы API увидят стартап после периодической перестройки индекса
+        similarity_index.add_startup(startup)
+        
+        return {"message": "Стартап одобрен и опубликован", "startup_id": startup.id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка при одобрении стартапа: {str(e)}"
+        )
+
 # Webhook для Telegram бота
 @app.post("/api/webhook/telegram")
 async def telegram_webhook(
     data: dict,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Webhook для обработки событий от Telegram бота"""
     try:
@@ -1464,20 +2510,46 @@ async def telegram_webhook(
         
         event = TelegramEvent(
             event_type="telegram_webhook_received",
-            metadata=data,
+            metadata_=data,
             created_at=datetime.utcnow()
         )
         db.add(event)
-        db.commit()
+        await db.commit()
         
         return {"status": "received", "message": "Webhook успешно обработан"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Ошибка при обработке webhook: {str(e)}"
         )
 
+# Метрики кэшей и фоновых буферов
+@app.get("/api/metrics")
+async def get_metrics(
+    current_user: UserPrincipal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Счетчики внутренних кэшей и буферов процесса, глубина очереди заданий (только для администраторов)"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав"
+        )
+    
+    return {
+        "db_pools": get_pool_stats(),
+        "catalog_cache": catalog_cache.get_stats(),
+        "token_cache": token_cache.get_stats(),
+        "principal_cache": principal_cache.get_stats(),
+        "like_state_cache": like_state_cache.get_stats(),
+        "view_tracker": {**view_tracker.stats, "pending": view_tracker.queue.qsize()},
+        "score_recomputer": {**score_recomputer.stats, "pending": len(score_recomputer.pending)},
+        "matching_index": matching_index.get_stats(),
+        "similarity_index": similarity_index.get_stats(),
+        "job_queue": await get_job_queue_stats(db)
+    }
+
 # Health check
 @app.get("/api/health")
 async def health_check():
@@ -0,0 +1,475 @@
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterable
+
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import User, RematchJob, MatchFeed
+
+# Индекс мэтчинга: полная перестройка раз в MATCHING_INDEX_REFRESH секунд
+# (подхватывает изменения профилей, сделанные другими процессами)
+MATCHING_INDEX_REFRESH = float(os.getenv("MATCHING_INDEX_REFRESH", "300"))
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "50"))  # сколько лучших кандидатов сохранять
+
+# Веса признаков в итоговой оценке (сумма весов роли = 1)
+INVESTOR_WEIGHTS = {"category": 0.5, "region": 0.3, "range": 0.2}
+MENTOR_WEIGHTS = {"specialty": 0.7, "experience": 0.3}
+MENTOR_EXPERIENCE_CAP = 20  # опыт (лет), дающий максимальный балл
+
+# Поля профиля, от которых зависит мэтчинг (их изменение запускает пересчет)
+MATCH_PROFILE_FIELDS = [
+    "is_active", "mentor_availability",
+    "investment_interests", "investment_regions", "investment_range",
+    "mentor_specialties", "mentor_experience"
+]
+
+
+# ==================== МАТРИЦЫ ПРИЗНАКОВ ====================
+
+class CandidateMatrix:
+    """Признаки кандидатов одной роли: разреженные колонки тегов и числовые колонки с запасом емкости"""
+    
+    def __init__(self, entries: Dict[int, Dict[str, Any]], tag_features: List[str], numeric_features: List[str]):
+        self.size = 0
+        self.rows: Dict[int, int] = {}  # user_id -> строка
+        self._ids = np.empty(0, dtype=np.int64)
+        self._active = np.empty(0, dtype=bool)
+        self._numeric = {feature: np.empty(0, dtype=np.float64) for feature in numeric_features}
+        # Колонки тегов хранятся разреженно (тег -> строки): память растет с числом пар кандидат-тег,
+        # а не с произведением кандидатов на словарь; новые пользователи и теги не требуют перестройки
+        self.columns: Dict[str, Dict[str, set]] = {feature: {} for feature in tag_features}
+        self._row_tags: Dict[int, Dict[str, tuple]] = {}  # строка -> ее теги (для снятия при обновлении)
+        self._column_arrays: Dict[tuple, np.ndarray] = {}  # кэш колонок как массивов строк
+        
+        for user_id in sorted(entries):
+            self.update(user_id, entries[user_id])
+        
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self.size]
+    
+    @property
+    def active(self) -> np.ndarray:
+        return self._active[:self.size]
+    
+    @property
+    def numeric(self) -> Dict[str, np.ndarray]:
+        return {feature: values[:self.size] for feature, values in self._numeric.items()}
+    
+    def _append(self, user_id: int) -> int:
+        if self.size == len(self._ids):
+            # Удвоение емкости: добавление строки - амортизированно O(1)
+            capacity = max(16, 2 * len(self._ids))
+            self._ids = np.resize(self._ids, capacity)
+            self._active = np.resize(self._active, capacity)
+            self._numeric = {feature: np.resize(values, capacity) for feature, values in self._numeric.items()}
+        row = self.size
+        self.size += 1
+        self._ids[row] = user_id
+        self._active[row] = False
+        self.rows[user_id] = row
+        return row
+    
+    def _set_tags(self, row: int, tags: Dict[str, Iterable[str]]):
+        old = self._row_tags.pop(row, {})
+        for feature, columns in self.columns.items():
+            new = tuple(tags.get(feature, ()))
+            for tag in set(old.get(feature, ())).symmetric_difference(new):
+                self._column_arrays.pop((feature, tag), None)
+            for tag in old.get(feature, ()):
+                rows = columns[tag]
+                rows.discard(row)
+                if not rows:
+                    del columns[tag]
+            for tag in new:
+                columns.setdefault(tag, set()).add(row)
+        self._row_tags[row] = {feature: tuple(tags.get(feature, ())) for feature in self.columns}
+    
+    def update(self, user_id: int, entry: Optional[Dict[str, Any]]):
+        """Обновление строки кандидата на месте; новый пользователь - новая строка в конце"""
+        row = self.rows.get(user_id)
+        if entry is None:
+            if row is not None:
+                self._active[row] = False
+                self._set_tags(row, {})
+            return
+        if row is None:
+            row = self._append(user_id)
+        self._set_tags(row, entry["tags"])
+        for feature, values in self._numeric.items():
+            value = entry.get(feature)
+            values[row] = np.nan if value is None else value
+        self._active[row] = True
+    
+    def tag_match(self, feature: str, tag: Optional[str]) -> np.ndarray:
+        """Вектор 0/1: есть ли у кандидата тег"""
+        match = np.zeros(self.size, dtype=np.float64)
+        rows = self.columns[feature].get(tag) if tag else None
+        if rows:
+            key = (feature, tag)
+            array = self._column_arrays.get(key)
+            if array is None:
+                array = self._column_arrays[key] = np.fromiter(rows, dtype=np.int64, count=len(rows))
+            match[array] = 1.0
+        return match
+
+
+def range_fit(low: np.ndarray, high: np.ndarray, asked: Optional[float]) -> np.ndarray:
+    """Соответствие запрошенной суммы диапазону инвестора: 1 внутри, доля при выходе за границы, 0.5 если неизвестно"""
+    if not asked:
+        return np.full(len(low), 0.5)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fit = np.where(asked < low, asked / low, np.where(asked > high, high / asked, 1.0))
+    fit = np.where(np.isnan(low) & np.isnan(high), 0.5, fit)
+    return np.clip(np.nan_to_num(fit, nan=0.5), 0.0, 1.0)
+
+
+def top_k(ids: np.ndarray, scores: np.ndarray, eligible: np.ndarray, k: int) -> np.ndarray:
+    """Строки k лучших кандидатов: оценка по убыванию, при равенстве - id по возрастанию"""
+    rows = np.flatnonzero(eligible)
+    if k <= 0 or not len(rows):
+        return rows[:0]
+    if len(rows) > k:
+        # Все строки не хуже k-й оценки (вместе с равными ей): строки добавленных пользователей
+        # идут не по порядку id, и argpartition выбрал бы среди равных произвольные
+        kth = np.partition(-scores[rows], k - 1)[k - 1]
+        rows = rows[-scores[rows] <= kth]
+    return rows[np.lexsort((ids[rows], -scores[rows]))][:k]
+
+
+def ranked_matches(matrix: CandidateMatrix, rows: np.ndarray, total: np.ndarray, breakdown: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": int(matrix.ids[row]),
+            "score": round(float(total[row]) * 100, 1),
+            "breakdown": {feature: round(float(values[row]), 3) for feature, values in breakdown.items()}
+        }
+        for row in rows
+    ]
+
+
+def score_investors(matrix: CandidateMatrix, category: Optional[str], region: Optional[str],
+                    investment_asked: Optional[float], k: int) -> List[Dict[str, Any]]:
+    """Оценка всех инвесторов одним проходом; кандидат - совпадение категории или региона"""
+    breakdown = {
+        "category": matrix.tag_match("interests", category),
+        "region": matrix.tag_match("regions", region),
+        "range": range_fit(matrix.numeric["range_min"], matrix.numeric["range_max"], investment_asked)
+    }
+    total = sum(INVESTOR_WEIGHTS[feature] * values for feature, values in breakdown.items())
+    eligible = matrix.active & ((breakdown["category"] > 0) | (breakdown["region"] > 0))
+    return ranked_matches(matrix, top_k(matrix.ids, total, eligible, k), total, breakdown)
+
+
+def score_mentors(matrix: CandidateMatrix, category: Optional[str], k: int) -> List[Dict[str, Any]]:
+    """Оценка всех доступных менторов одним проходом; кандидат - специализация в категории стартапа"""
+    experience = np.nan_to_num(matrix.numeric["experience"], nan=0.0)
+    breakdown = {
+        "specialty": matrix.tag_match("specialties", category),
+        "experience": np.clip(experience / MENTOR_EXPERIENCE_CAP, 0.0, 1.0)
+    }
+    total = sum(MENTOR_WEIGHTS[feature] * values for feature, values in breakdown.items())
+    eligible = matrix.active & (breakdown["specialty"] > 0)
+    return ranked_matches(matrix, top_k(matrix.ids, total, eligible, k), total, breakdown)
+
+
+# ==================== ИНДЕКС КАНДИДАТОВ ====================
+
+# Профили кандидатов и их матрицы признаков; колонки тегов матрицы заменяют
+# инвертированный индекс - кандидаты отбираются по ним в score_investors/score_mentors
+class MatchingIndex:
+    """Индекс активных инвесторов и доступных менторов по категориям, регионам и специализациям"""
+    
+    # Признаки матриц по ролям: (теги, числовые)
+    FEATURES = {
+        "investor": (["interests", "regions"], ["range_min", "range_max"]),
+        "mentor": (["specialties"], ["experience"])
+    }
+    
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[int, Dict[str, Any]] = {}  # user_id -> проиндексированный профиль
+        self._matrices: Dict[str, CandidateMatrix] = {}  # роль -> матрица признаков
+        self._built_at = None
+        # Изменения профилей во время перестройки: (user_id, профиль или None)
+        self._changes = None
+        self._lock = threading.Lock()
+        self._build_lock = asyncio.Lock()
+    
+    @staticmethod
+    def _tags(values: Optional[Iterable]) -> tuple:
+        if not values or not isinstance(values, (list, tuple, set)):
+            return ()
+        return tuple(sorted({value for value in values if isinstance(value, str)}))
+    
+    @staticmethod
+    def _number(value) -> Optional[float]:
+        return float(value) if isinstance(value, (int, float)) else None
+    
+    def _entry_for(self, row) -> Optional[Dict[str, Any]]:
+        if not row.is_active:
+            return None
+        if row.role == "investor":
+            investment_range = row.investment_range if isinstance(row.investment_range, dict) else {}
+            return {
+                "role": "investor",
+                "tags": {
+                    "interests": self._tags(row.investment_interests),
+                    "regions": self._tags(row.investment_regions)
+                },
+                "range_min": self._number(investment_range.get("min")),
+                "range_max": self._number(investment_range.get("max"))
+            }
+        if row.role == "mentor" and row.mentor_availability is not False:
+            return {
+                "role": "mentor",
+                "tags": {"specialties": self._tags(row.mentor_specialties)},
+                "experience": self._number(row.mentor_experience)
+            }
+        return None
+    
+    def _add(self, user_id: int, entry: Optional[Dict[str, Any]]):
+        if entry is not None:
+            self._entries[user_id] = entry
+    
+    def _remove(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._entries.pop(user_id, None)
+    
+    def _build_from_rows(self, rows):
+        # Профили и матрицы собираются без блокировки, ранжирование в это время идет по старым
+        entries = {}
+        for row in rows:
+            entry = self._entry_for(row)
+            if entry is not None:
+                entries[row.id] = entry
+        matrices = {
+            role: CandidateMatrix(
+                {user_id: entry for user_id, entry in entries.items() if entry["role"] == role},
+                tag_features, numeric_features
+            )
+            for role, (tag_features, numeric_features) in self.FEATURES.items()
+        }
+        with self._lock:
+            self._entries = entries
+            self._matrices = matrices
+            # Изменения профилей, пришедшие после начала выборки
+            changes, self._changes = self._changes or [], None
+            for user_id, entry in changes:
+                self._apply(user_id, entry)
+            self._built_at = time.monotonic()
+    
+    async def build(self, db: AsyncSession):
+        """Полная перестройка индекса одним запросом по нужным колонкам (матрицы - в отдельном потоке)"""
+        async with self._build_lock:
+            await self._build(db)
+        
+    async def _build(self, db: AsyncSession):
+        # Журнал изменений - до выборки: все, что не попало в нее, будет применено к новому состоянию
+        with self._lock:
+            self._changes = []
+        try:
+            rows = (await db.execute(
+                select(
+                    User.id, User.role, User.is_active, User.mentor_availability,
+                    User.investment_interests, User.investment_regions, User.investment_range,
+                    User.mentor_specialties, User.mentor_experience
+                ).where(User.role.in_(["investor", "mentor"]), User.is_active == True)
+            )).all()
+            await asyncio.to_thread(self._build_from_rows, rows)
+        finally:
+            with self._lock:
+                self._changes = None
+    
+    async def ensure_fresh(self, db: AsyncSession):
+        """Перестройка индекса, если он еще не построен или устарел"""
+        if self._built_at is not None and time.monotonic() - self._built_at < self.refresh_interval:
+            return
+        async with self._build_lock:
+            if self._built_at is None or time.monotonic() - self._built_at >= self.refresh_interval:
+                await self._build(db)
+    
+    def _apply(self, user_id: int, entry: Optional[Dict[str, Any]]):
+        old = self._remove(user_id)
+        self._add(user_id, entry)
+        for role in {item["role"] for item in (old, entry) if item}:
+            matrix = self._matrices.get(role)
+            if matrix is not None:
+                matrix.update(user_id, entry if entry and entry["role"] == role else None)
+        if self._changes is not None:
+            self._changes.append((user_id, entry))
+    
+    def update_user(self, user: User):
+        """Инкрементальное обновление после изменения профиля (новые пользователи и теги - без перестройки)"""
+        entry = self._entry_for(user)
+        with self._lock:
+            self._apply(user.id, entry)
+    
+    def remove_user(self, user_id: int):
+        with self._lock:
+            self._apply(user_id, None)
+    
+    def _matrix(self, role: str) -> CandidateMatrix:
+        # Матрицы строит build(); здесь - только если индекс заполнялся без него
+        matrix = self._matrices.get(role)
+        if matrix is None:
+            tag_features, numeric_features = self.FEATURES[role]
+            entries = {user_id: entry for user_id, entry in self._entries.items() if entry["role"] == role}
+            matrix = self._matrices[role] = CandidateMatrix(entries, tag_features, numeric_features)
+        return matrix
+    
+    def rank_investors(self, category: Optional[str], region: Optional[str],
+                       investment_asked: Optional[float], k: int = MATCH_TOP_K) -> List[Dict[str, Any]]:
+        """Топ-k инвесторов с разбивкой оценки по признакам"""
+        with self._lock:
+            return score_investors(self._matrix("investor"), category, region, investment_asked, k)
+    
+    def rank_mentors(self, category: Optional[str], k: int = MATCH_TOP_K) -> List[Dict[str, Any]]:
+        """Топ-k менторов с разбивкой оценки по признакам"""
+        with self._lock:
+            return score_mentors(self._matrix("mentor"), category, k)
+    
+    def rank(self, role: str, startup, k: int = MATCH_TOP_K) -> List[Dict[str, Any]]:
+        if role == "investor":
+            return self.rank_investors(startup.category, startup.region, startup.investment_asked, k)
+        return self.rank_mentors(startup.category, k)
+    
+    def candidate_matrix(self, user: User) -> Optional[CandidateMatrix]:
+        """Матрица из одного пользователя - для пересчета его оценки по многим стартапам"""
+        entry = self._entry_for(user)
+        if entry is None:
+            return None
+        tag_features, numeric_features = self.FEATURES[entry["role"]]
+        return CandidateMatrix({user.id: entry}, tag_features, numeric_features)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._entries),
+            "matrices": {
+                role: {"rows": matrix.size, **{feature: len(columns) for feature, columns in matrix.columns.items()}}
+                for role, matrix in self._matrices.items()
+            },
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None
+        }
+
+
+matching_index = MatchingIndex(MATCHING_INDEX_REFRESH)
+
+
+# ==================== ИНКРЕМЕНТАЛЬНЫЙ ПЕРЕСЧЕТ ====================
+
+def score_candidate(candidate: CandidateMatrix, role: str, startup) -> Optional[Dict[str, Any]]:
+    """Оценка одного кандидата для стартапа (None - не проходит по признакам)"""
+    if role == "investor":
+        matches = score_investors(candidate, startup.category, startup.region, startup.investment_asked, 1)
+    else:
+        matches = score_mentors(candidate, startup.category, 1)
+    return matches[0] if matches else None
+
+
+def merge_match(matches: List[Dict[str, Any]], user_id: int, match: Optional[Dict[str, Any]],
+                k: int = MATCH_TOP_K) -> List[Dict[str, Any]]:
+    """Замена оценки одного кандидата в ранжированном списке с сохранением порядка и топ-k"""
+    merged = [item for item in matches if item["id"] != user_id]
+    if match is not None:
+        merged.append(match)
+    merged.sort(key=lambda item: (-item["score"], item["id"]))
+    return merged[:k]
+
+
+async def replace_match_feed(db: AsyncSession, startup_id: int, matches_by_role: Dict[str, List[Dict[str, Any]]]):
+    """Перезапись строк ленты стартапа по его ранжированным спискам (коммитит вызывающий)"""
+    feed = MatchFeed.__table__
+    await db.execute(delete(feed).where(feed.c.startup_id == startup_id, feed.c.role.in_(list(matches_by_role))))
+    now = datetime.utcnow()
+    rows = [
+        {
+            "user_id": match["id"],
+            "startup_id": startup_id,
+            "role": role,
+            "score": match["score"],
+            "breakdown": match.get("breakdown"),
+            "updated_at": now
+        }
+        for role, matches in matches_by_role.items()
+        for match in matches
+    ]
+    if rows:
+        await db.execute(feed.insert(), rows)
+
+
+def profile_snapshot(user: User) -> Dict[str, Any]:
+    return {field: getattr(user, field) for field in MATCH_PROFILE_FIELDS}
+
+
+def rematch_job_for(user: User, before: Dict[str, Any]) -> Optional[RematchJob]:
+    """Задание пересчета, если изменились влияющие на мэтчинг поля профиля (добавляет вызывающий)"""
+    if user.role not in ("investor", "mentor") or profile_snapshot(user) == before:
+        return None
+    tags = MatchingIndex._tags
+    if user.role == "investor":
+        categories = set(tags(before["investment_interests"])) | set(tags(user.investment_interests))
+        regions = set(tags(before["investment_regions"])) | set(tags(user.investment_regions))
+    else:
+        categories = set(tags(before["mentor_specialties"])) | set(tags(user.mentor_specialties))
+        regions = set()
+    if not categories and not regions:
+        return None
+    return RematchJob(user_id=user.id, role=user.role, categories=sorted(categories), regions=sorted(regions))
+
+
+# ==================== БЕНЧМАРК ====================
+
+def benchmark(candidates: int = 100000, queries: int = 100):
+    """Замер построения матриц и оценки кандидатов на синтетических профилях"""
+    rng = np.random.default_rng(42)
+    categories = [f"category_{i}" for i in range(40)]
+    regions = [f"region_{i}" for i in range(20)]
+    
+    def investor(extra_interest: Optional[str] = None) -> Dict[str, Any]:
+        low = float(rng.integers(1, 100)) * 10000
+        interests = tuple(rng.choice(categories, size=3, replace=False))
+        return {
+            "role": "investor",
+            "tags": {
+                "interests": interests + ((extra_interest,) if extra_interest else ()),
+                "regions": tuple(rng.choice(regions, size=2, replace=False))
+            },
+            "range_min": low,
+            "range_max": low * 10
+        }
+    
+    index = MatchingIndex(MATCHING_INDEX_REFRESH)
+    for user_id in range(1, candidates + 1):
+        index._add(user_id, investor())
+    
+    started = time.perf_counter()
+    index._matrix("investor")
+    build_ms = (time.perf_counter() - started) * 1000
+    
+    # Регистрации с тегами, которых еще нет в индексе: строка и колонка добавляются без перестройки
+    signups = 1000
+    started = time.perf_counter()
+    for user_id in range(candidates + 1, candidates + signups + 1):
+        with index._lock:
+            index._apply(user_id, investor(f"new_tag_{user_id}"))
+    signup_ms = (time.perf_counter() - started) * 1000 / signups
+    
+    started = time.perf_counter()
+    for _ in range(queries):
+        index.rank_investors(str(rng.choice(categories)), str(rng.choice(regions)), float(rng.integers(1, 1000)) * 1000)
+    query_ms = (time.perf_counter() - started) * 1000 / queries
+    
+    print(
+        f"📊 Кандидатов: {candidates}, построение матриц: {build_ms:.1f} мс, "
+        f"новый кандидат: {signup_ms:.3f} мс, оценка + топ-{MATCH_TOP_K}: {query_ms:.2f} мс/запрос"
+    )
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
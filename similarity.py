@@ -0,0 +1,342 @@
+import os
+import re
+import math
+import time
+import zlib
+import asyncio
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, Startup, CATALOG_VISIBLE
+
+# Индекс похожих стартапов: полная перестройка раз в SIMILARITY_INDEX_REFRESH секунд
+# (пересчитывает idf и подхватывает изменения, сделанные другими процессами)
+SIMILARITY_INDEX_REFRESH = float(os.getenv("SIMILARITY_INDEX_REFRESH", "3600"))
+SIMILARITY_FEATURES = 2 ** 20  # размер пространства хэшированных признаков
+SIMILARITY_QUERY_TERMS = 32  # сколько самых весомых термов запроса участвуют в поиске
+# Термы, встречающиеся чаще чем в этой доле документов (но не менее чем в SIMILARITY_MAX_DF_MIN), игнорируются:
+# их длинные постинги дороги, а вклад в близость из-за низкого idf мал
+SIMILARITY_MAX_DF = 0.1
+SIMILARITY_MAX_DF_MIN = 1000
+
+# Вес полей стартапа в векторе документа
+FIELD_WEIGHTS = {"name": 2, "short_description": 2, "description": 1, "target_audience": 1}
+CATEGORY_WEIGHT = 3
+
+TOKEN_PATTERN = re.compile(r"[^\W_]{2,}", re.UNICODE)
+STOP_WORDS = {
+    "и", "в", "во", "на", "с", "со", "по", "для", "из", "от", "до", "за", "не", "что", "это", "как",
+    "мы", "наш", "наша", "наши", "который", "которые", "или", "а", "но", "к", "у", "о", "при",
+    "the", "and", "for", "with", "our", "to", "of", "in", "on", "is", "are", "an", "we", "by"
+}
+
+
+@lru_cache(maxsize=200000)
+def feature_id(token: str) -> int:
+    # crc32 вместо hash(): номер признака не зависит от процесса (PYTHONHASHSEED)
+    return zlib.crc32(token.encode()) % SIMILARITY_FEATURES
+
+
+def term_frequencies(startup) -> Dict[int, float]:
+    """Сублинейные частоты хэшированных термов стартапа (поля с весами, категория - отдельный признак)"""
+    # Вес поля - повтор его токенов; подсчет и фильтрация стоп-слов - одним Counter на документ
+    tokens = []
+    for field, weight in FIELD_WEIGHTS.items():
+        text = getattr(startup, field, None)
+        if text:
+            tokens.extend(TOKEN_PATTERN.findall(text.lower()) * weight)
+    if getattr(startup, "category", None):
+        tokens.extend([f"category:{startup.category.lower()}"] * CATEGORY_WEIGHT)
+    
+    counts = Counter(tokens)
+    for word in STOP_WORDS.intersection(counts):
+        del counts[word]
+    frequencies = {}
+    for token, count in counts.items():
+        feature = feature_id(token)
+        frequencies[feature] = frequencies.get(feature, 0) + count
+    return {feature: 1 + math.log(count) for feature, count in frequencies.items()}
+
+
+class SimilarityIndex:
+    """TF-IDF индекс опубликованных стартапов с поиском ближайших соседей по косинусной мере"""
+    
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.__dict__.update(self._load([]))
+        self._built_at = None
+        # Изменения, сделанные во время перестройки: (startup_id, вектор или None для удаления)
+        self._changes = None
+        self._lock = threading.Lock()
+        self._build_lock = asyncio.Lock()
+        self._rebuild_task = None
+    
+    @staticmethod
+    def _load(vectors: List[Tuple[int, Dict[int, float]]]) -> Dict[str, Any]:
+        """Состояние индекса по всем документам: постинги - срезы массивов, отсортированных по признаку"""
+        lengths = np.fromiter((len(vector) for _, vector in vectors), dtype=np.int64, count=len(vectors))
+        total = int(lengths.sum())
+        features = np.fromiter((feature for _, vector in vectors for feature in vector), dtype=np.int64, count=total)
+        values = np.fromiter((tf for _, vector in vectors for tf in vector.values()), dtype=np.float32, count=total)
+        rows = np.repeat(np.arange(len(vectors), dtype=np.int32), lengths)
+        
+        order = np.argsort(features, kind="stable")
+        features, rows, values = features[order], rows[order], values[order]
+        unique, starts, counts = np.unique(features, return_index=True, return_counts=True)
+        
+        # Нормы документов по окончательному df - одним bincount
+        idf = np.log((1 + len(vectors)) / (1 + counts)) + 1
+        weights = values * np.repeat(idf, counts)
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(vectors)))
+        norms[norms == 0] = 1.0
+        
+        ids = [startup_id for startup_id, _ in vectors]
+        return {
+            "ids": ids,
+            "rows": {startup_id: row for row, startup_id in enumerate(ids)},  # startup_id -> строка
+            "active": [True] * len(vectors),
+            "norms": norms.tolist(),
+            "document_frequency": Counter(dict(zip(unique.tolist(), counts.tolist()))),
+            "_base": {
+                feature: (rows[start:start + count], values[start:start + count])
+                for feature, start, count in zip(unique.tolist(), starts.tolist(), counts.tolist())
+            },
+            # Признаки строки загрузки - по позициям в rows: признак позиции - unique[номер среза]
+            "_base_size": len(vectors),
+            "_base_rows": rows,
+            "_base_features": unique,
+            "_base_starts": starts,
+            "postings": {},  # добавленные после загрузки: признак -> ([строки], [tf])
+            "_added_features": {},  # строка, добавленная после загрузки -> ее признаки
+            "_arrays": {}  # кэш объединенных постингов
+        }
+    
+    @property
+    def size(self) -> int:
+        return len(self.rows)
+    
+    def idf(self, feature: int) -> float:
+        return math.log((1 + self.size) / (1 + self.document_frequency.get(feature, 0))) + 1
+    
+    def _add(self, startup_id: int, vector: Dict[int, float]):
+        self._remove(startup_id)
+        row = len(self.ids)
+        self.rows[startup_id] = row
+        self.ids.append(startup_id)
+        self.active.append(True)
+        self._added_features[row] = list(vector)
+        self.document_frequency.update(vector.keys())
+        for feature, tf in vector.items():
+            rows, values = self.postings.setdefault(feature, ([], []))
+            rows.append(row)
+            values.append(tf)
+            self._arrays.pop(feature, None)
+        # Норма считается по текущему idf; дрейф idf исправляет периодическая перестройка
+        self.norms.append(math.sqrt(sum((tf * self.idf(feature)) ** 2 for feature, tf in vector.items())) or 1.0)
+    
+    def _row_features(self, row: int) -> List[int]:
+        if row < self._base_size:
+            positions = np.flatnonzero(self._base_rows == row)
+            return self._base_features[np.searchsorted(self._base_starts, positions, side="right") - 1].tolist()
+        return self._added_features.get(row, [])
+    
+    def _remove(self, startup_id: int):
+        # Строка скрывается (постинги очищает следующая перестройка), ее термы вычитаются из df -
+        # иначе повторное добавление того же стартапа занижало бы idf его термов
+        row = self.rows.pop(startup_id, None)
+        if row is None:
+            return
+        self.active[row] = False
+        for feature in self._row_features(row):
+            count = self.document_frequency[feature] - 1
+            if count > 0:
+                self.document_frequency[feature] = count
+            else:
+                del self.document_frequency[feature]
+        self._added_features.pop(row, None)
+    
+    def _posting_arrays(self, feature: int) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(feature)
+        if arrays is None:
+            base_rows, base_values = self._base.get(feature, (np.empty(0, np.int32), np.empty(0, np.float32)))
+            rows, values = self.postings.get(feature, ([], []))
+            arrays = self._arrays[feature] = (
+                np.concatenate([base_rows, np.asarray(rows, dtype=np.int32)]),
+                np.concatenate([base_values, np.asarray(values, dtype=np.float32)])
+            )
+        return arrays
+    
+    def _build_from_rows(self, startups):
+        # Новое состояние собирается без блокировки, запросы в это время идут по старому
+        state = self._load([(startup.id, term_frequencies(startup)) for startup in startups])
+        with self._lock:
+            self.__dict__.update(state)
+            # Добавления и удаления, пришедшие после начала выборки, иначе потерялись бы до следующей перестройки
+            for startup_id, vector in self._changes or []:
+                if vector is None:
+                    self._remove(startup_id)
+                else:
+                    self._add(startup_id, vector)
+            self._changes = None
+            self._built_at = time.monotonic()
+    
+    async def _build(self, db: AsyncSession):
+        # Журнал изменений - до выборки: все, что не попало в нее, будет применено к новому состоянию
+        with self._lock:
+            self._changes = []
+        try:
+            startups = (await db.execute(
+                select(
+                    Startup.id, Startup.name, Startup.short_description, Startup.description,
+                    Startup.category, Startup.target_audience
+                ).where(CATALOG_VISIBLE)
+            )).all()
+            await asyncio.to_thread(self._build_from_rows, startups)
+        finally:
+            with self._lock:
+                self._changes = None
+    
+    async def build(self, db: AsyncSession):
+        """Полная перестройка по опубликованным стартапам (расчет - в отдельном потоке)"""
+        # Перестройки по очереди: у журнала изменений один владелец
+        async with self._build_lock:
+            await self._build(db)
+    
+    async def _rebuild(self):
+        try:
+            async with AsyncSessionLocal() as db:
+                await self.build(db)
+        except Exception as e:
+            print(f"Ошибка при перестройке индекса похожих стартапов: {e}")
+    
+    async def ensure_fresh(self, db: AsyncSession):
+        """Первое построение - сразу; устаревший индекс перестраивается в фоне, запросы идут по текущему"""
+        if self._built_at is None:
+            async with self._build_lock:
+                if self._built_at is None:
+                    await self._build(db)
+            return
+        if time.monotonic() - self._built_at >= self.refresh_interval:
+            if self._rebuild_task is None or self._rebuild_task.done():
+                self._rebuild_task = asyncio.create_task(self._rebuild())
+    
+    def add_startup(self, startup: Startup):
+        """Инкрементальное добавление (или замена) стартапа после одобрения или изменения"""
+        vector = term_frequencies(startup)
+        with self._lock:
+            self._add(startup.id, vector)
+            if self._changes is not None:
+                self._changes.append((startup.id, vector))
+    
+    def remove_startup(self, startup_id: int):
+        with self._lock:
+            self._remove(startup_id)
+            if self._changes is not None:
+                self._changes.append((startup_id, None))
+    
+    def similar(self, startup, k: int = 10) -> List[Tuple[int, float]]:
+        """k ближайших стартапов: [(startup_id, косинусная близость)]"""
+        vector = term_frequencies(startup)
+        with self._lock:
+            if not vector or not self.size:
+                return []
+            
+            # Самые весомые термы запроса; слишком частые термы почти не влияют на близость
+            max_df = max(SIMILARITY_MAX_DF_MIN, int(self.size * SIMILARITY_MAX_DF))
+            weights = {
+                feature: tf * self.idf(feature)
+                for feature, tf in vector.items()
+                if 0 < self.document_frequency.get(feature, 0) <= max_df
+            }
+            terms = sorted(weights.items(), key=lambda item: -item[1])[:SIMILARITY_QUERY_TERMS]
+            if not terms:
+                return []
+            query_norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+            
+            # Скалярные произведения со всеми документами - одним bincount по постингам
+            row_parts, value_parts = [], []
+            for feature, weight in terms:
+                rows, values = self._posting_arrays(feature)
+                row_parts.append(rows)
+                value_parts.append(values * (weight * self.idf(feature)))
+            scores = np.bincount(np.concatenate(row_parts), weights=np.concatenate(value_parts), minlength=len(self.ids))
+            scores /= np.asarray(self.norms, dtype=np.float64) * query_norm
+            
+            mask = np.asarray(self.active, dtype=bool) & (scores > 0)
+            row = self.rows.get(startup.id)
+            if row is not None:
+                mask[row] = False
+            candidates = np.flatnonzero(mask)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self.ids[row], round(float(scores[row]), 4)) for row in candidates]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "startups": self.size,
+            "features": len(self.document_frequency),
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None
+        }
+
+
+similarity_index = SimilarityIndex(SIMILARITY_INDEX_REFRESH)
+
+
+# ==================== БЕНЧМАРК ====================
+
+def benchmark(startups: int = 100000, queries: int = 200):
+    """Замер построения индекса и поиска похожих на синтетических описаниях"""
+    from types import SimpleNamespace
+    
+    rng = np.random.default_rng(42)
+    vocabulary = [f"слово{i}" for i in range(20000)]
+    categories = [f"category_{i}" for i in range(40)]
+    # Частоты слов по закону Ципфа, как в естественном тексте
+    probabilities = 1 / np.arange(1, len(vocabulary) + 1)
+    probabilities /= probabilities.sum()
+    
+    def document(startup_id: int):
+        words = rng.choice(len(vocabulary), size=80, p=probabilities)
+        return SimpleNamespace(
+            id=startup_id,
+            name=" ".join(vocabulary[i] for i in words[:3]),
+            short_description=" ".join(vocabulary[i] for i in words[3:15]),
+            description=" ".join(vocabulary[i] for i in words[15:]),
+            category=str(rng.choice(categories)),
+            target_audience=None
+        )
+    
+    documents = [document(startup_id) for startup_id in range(1, startups + 1)]
+    index = SimilarityIndex(SIMILARITY_INDEX_REFRESH)
+    started = time.perf_counter()
+    index._build_from_rows(documents)
+    build_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    for startup_id in rng.integers(1, startups + 1, size=queries):
+        index.similar(documents[startup_id - 1], k=10)
+    query_ms = (time.perf_counter() - started) * 1000 / queries
+    
+    started = time.perf_counter()
+    index.add_startup(document(startups + 1))
+    add_ms = (time.perf_counter() - started) * 1000
+    
+    # Замена уже проиндексированного стартапа: вычитание его термов из df
+    started = time.perf_counter()
+    index.add_startup(documents[0])
+    replace_ms = (time.perf_counter() - started) * 1000
+    
+    print(f"📊 Стартапов: {startups}, построение: {build_seconds:.1f} с, "
+          f"поиск топ-10: {query_ms:.2f} мс/запрос, добавление: {add_ms:.2f} мс, замена: {replace_ms:.2f} мс")
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import List, Optional, Dict, Any
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+# Настройки Telegram Bot API
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_REQUEST_TIMEOUT = float(os.getenv("TELEGRAM_REQUEST_TIMEOUT", "10"))  # секунды
+
+# Лимиты отправки (Telegram: ~30 сообщений/с на бота и ~1 сообщение/с в один чат)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))  # сообщений в секунду
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))  # сообщений в секунду в один чат
+TELEGRAM_MAX_CONCURRENCY = int(os.getenv("TELEGRAM_MAX_CONCURRENCY", "10"))  # одновременных запросов
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "20"))  # размер HTTP пула
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+
+class TelegramAPIError(Exception):
+    """Ошибка ответа Telegram Bot API"""
+    
+    def __init__(self, status_code: int, description: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status_code}: {description}")
+        self.status_code = status_code
+        self.description = description
+        self.retry_after = retry_after
+
+
+class TelegramClient:
+    """Клиент Telegram Bot API (sendMessage)"""
+    
+    def __init__(self, token: str = TELEGRAM_BOT_TOKEN, api_url: str = TELEGRAM_API_URL):
+        self.base_url = f"{api_url.rstrip('/')}/bot{token}"
+        # Один пул соединений на процесс, keep-alive к api.telegram.org
+        self.http = httpx.AsyncClient(
+            timeout=TELEGRAM_REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=TELEGRAM_MAX_CONNECTIONS,
+                max_keepalive_connections=TELEGRAM_MAX_CONNECTIONS
+            )
+        )
+    
+    async def send_message(self, chat_id: str, text: str) -> Dict[str, Any]:
+        """Отправка сообщения; TelegramAPIError если Telegram вернул ошибку"""
+        response = await self.http.post(
+            f"{self.base_url}/sendMessage",
+            json={"chat_id": chat_id, "text": text}
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            # Ответ не от Bot API (например, HTML-страница 502 от прокси): ошибка со статусом
+            # и началом тела, диспетчер повторит отправку
+            raise TelegramAPIError(response.status_code, response.text[:200] or "Empty response body")
+        if response.status_code != 200 or not data.get("ok"):
+            parameters = data.get("parameters") or {}
+            raise TelegramAPIError(
+                response.status_code,
+                data.get("description", "Unknown error"),
+                parameters.get("retry_after")
+            )
+        return data["result"]
+    
+    async def close(self):
+        await self.http.aclose()
+
+
+# ==================== ОГРАНИЧЕНИЕ СКОРОСТИ ====================
+
+class TokenBucket:
+    """Ограничитель скорости для asyncio (token bucket)"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # пауза по retry_after от Telegram
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Ожидание свободного токена"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def block(self, seconds: float):
+        """Пауза после 429: токены не выдаются seconds секунд"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+    
+    def idle_for(self) -> float:
+        return time.monotonic() - max(self.updated, self.blocked_until)
+
+
+class TelegramSender:
+    """Отправка сообщений с лимитами на чат и на бота, повторами по 429 и метриками"""
+    
+    # Бакеты чатов, не использовавшиеся дольше этого времени, удаляются
+    CHAT_BUCKET_IDLE = 60
+    
+    def __init__(
+        self,
+        client: Optional[TelegramClient] = None,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        max_concurrency: int = TELEGRAM_MAX_CONCURRENCY,
+        max_retries: int = TELEGRAM_MAX_RETRIES
+    ):
+        self.client = client or TelegramClient()
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_buckets = {}
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.metrics = {
+            "sent": 0, "failed": 0, "rate_limited": 0, "retries": 0,
+            "in_flight": 0, "latency_total": 0.0, "latency_max": 0.0
+        }
+    
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 10000:
+                self.chat_buckets = {
+                    key: value for key, value in self.chat_buckets.items()
+                    if value.idle_for() < self.CHAT_BUCKET_IDLE
+                }
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, capacity=1)
+        return bucket
+    
+    async def send(self, chat_id: str, text: str) -> Dict[str, Any]:
+        """Отправка с учетом лимитов; TelegramAPIError/httpx.HTTPError если повторы исчерпаны"""
+        chat_bucket = self._chat_bucket(str(chat_id))
+        for attempt in range(self.max_retries + 1):
+            # Ждем лимиты до занятия слота, чтобы медленный чат не держал соединение
+            await chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            
+            async with self._semaphore:
+                self.metrics["in_flight"] += 1
+                started = time.perf_counter()
+                try:
+                    result = await self.client.send_message(chat_id, text)
+                except TelegramAPIError as e:
+                    if e.status_code == 429 and attempt < self.max_retries:
+                        self.metrics["rate_limited"] += 1
+                        self.metrics["retries"] += 1
+                        chat_bucket.block(e.retry_after or 1)
+                        continue
+                    self.metrics["failed"] += 1
+                    raise
+                except httpx.TransportError:
+                    if attempt < self.max_retries:
+                        self.metrics["retries"] += 1
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    self.metrics["failed"] += 1
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - started
+                    self.metrics["in_flight"] -= 1
+                    self.metrics["latency_total"] += elapsed
+                    self.metrics["latency_max"] = max(self.metrics["latency_max"], elapsed)
+                
+                self.metrics["sent"] += 1
+                return result
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        requests = self.metrics["sent"] + self.metrics["failed"] + self.metrics["retries"]
+        return {
+            "sent": self.metrics["sent"],
+            "failed": self.metrics["failed"],
+            "rate_limited": self.metrics["rate_limited"],
+            "retries": self.metrics["retries"],
+            "in_flight": self.metrics["in_flight"],
+            "latency_avg_ms": round(self.metrics["latency_total"] / requests * 1000, 3) if requests else 0,
+            "latency_max_ms": round(self.metrics["latency_max"] * 1000, 3),
+            "chat_buckets": len(self.chat_buckets)
+        }
+    
+    async def close(self):
+        await self.client.close()
+
+
+# ==================== ЛОКАЛЬНЫЙ ФЕЙКОВЫЙ BOT API ====================
+
+class FakeTelegramServer:
+    """Локальная заглушка Telegram Bot API для тестов и разработки"""
+    
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        fail_chat_ids: Optional[List[str]] = None,
+        throttle: Optional[Dict[str, int]] = None,
+        retry_after: int = 1
+    ):
+        # Принятые sendMessage; чаты из fail_chat_ids получают 400 (например, бот заблокирован)
+        self.sent_messages = []
+        self.fail_chat_ids = set(fail_chat_ids or [])
+        # Сколько раз ответить чату 429 Too Many Requests перед успешной отправкой
+        self.throttle = dict(throttle or {})
+        self.retry_after = retry_after
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def handle_send_message(self, payload: Dict[str, Any]):
+        """Ответ на sendMessage: (HTTP статус, тело ответа - dict для JSON или str как text/html)"""
+        chat_id = str(payload.get("chat_id"))
+        if chat_id in self.fail_chat_ids:
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"}
+        
+        with self._lock:
+            if self.throttle.get(chat_id, 0) > 0:
+                self.throttle[chat_id] -= 1
+                self.rate_limited += 1
+                return 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after}
+                }
+            message_id = len(self.sent_messages) + 1
+            self.sent_messages.append({"message_id": message_id, "chat_id": chat_id, "text": payload.get("text")})
+        return 200, {"ok": True, "result": {"message_id": message_id, "chat": {"id": chat_id}, "text": payload.get("text")}}
+    
+    def _make_handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = {}
+                
+                if self.path.endswith("/sendMessage"):
+                    status_code, body = server.handle_send_message(payload)
+                else:
+                    status_code, body = 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+                
+                # Строка - не JSON (как страница ошибки прокси перед Bot API)
+                raw = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "text/html" if isinstance(body, str) else "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    # Запуск заглушки: TELEGRAM_API_URL=http://127.0.0.1:8081 python worker.py notifications
+    fake = FakeTelegramServer(port=int(os.getenv("FAKE_TELEGRAM_PORT", "8081")))
+    print(f"🤖 Fake Telegram Bot API: {fake.url}")
+    fake._server.serve_forever()
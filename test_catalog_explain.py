@@ -0,0 +1,72 @@
+import os
+import re
+import tempfile
+
+import pytest
+
+# Отдельная SQLite база теста: движок создается при импорте database
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "catalog_explain.db")
+
+from sqlalchemy import text
+
+from database import engine, Base, Startup, CATALOG_ORDER, catalog_query
+
+# Комбинации фильтров get_startups -> индекс, который должен обслуживать выборку
+# (None - подходит любой из ix_startups_catalog*)
+FILTER_CASES = [
+    ({}, "ix_startups_catalog"),
+    ({"min_score": 50}, "ix_startups_catalog"),
+    ({"category": "FinTech"}, "ix_startups_catalog_category"),
+    ({"stage": "mvp"}, "ix_startups_catalog_stage"),
+    ({"region": "Global"}, "ix_startups_catalog_region"),
+    ({"category": "FinTech", "min_score": 50}, "ix_startups_catalog_category"),
+    ({"stage": "mvp", "min_score": 50}, "ix_startups_catalog_stage"),
+    ({"region": "Global", "min_score": 50}, "ix_startups_catalog_region"),
+    ({"category": "FinTech", "stage": "mvp"}, None),
+    ({"category": "FinTech", "stage": "mvp", "region": "Global", "min_score": 50}, None),
+]
+
+CATEGORIES = ["FinTech", "HealthTech", "EdTech", "AI/ML"]
+STAGES = ["idea", "mvp", "beta", "ready", "scaling"]
+REGIONS = ["Global", "Russia", "Europe"]
+
+
+@pytest.fixture(scope="module")
+def connection():
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Startup.__table__.insert(), [
+            {
+                "name": f"Startup {i}",
+                "description": "x" * 60,
+                "stage": STAGES[i % len(STAGES)],
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "region": REGIONS[i % len(REGIONS)],
+                "telegram_contact": f"@startup{i}",
+                "ai_score": i % 100,
+                "owner_id": 1,
+                "is_published": i % 10 != 0,
+                "is_approved": i % 7 != 0
+            }
+            for i in range(2000)
+        ])
+        # Статистика для планировщика, как на рабочей базе
+        conn.execute(text("ANALYZE"))
+    with engine.connect() as conn:
+        yield conn
+    Base.metadata.drop_all(engine)
+
+
+def explain(connection, query) -> str:
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    return "\n".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+
+@pytest.mark.parametrize("filters, index_name", FILTER_CASES)
+def test_catalog_page_uses_catalog_index(connection, filters, index_name):
+    plan = explain(connection, catalog_query(**filters).order_by(*CATALOG_ORDER).limit(13))
+    
+    pattern = re.escape(index_name) if index_name else r"ix_startups_catalog\w*"
+    assert re.search(rf"USING (COVERING )?INDEX {pattern}\b", plan), plan
+    # Порядок берется из индекса, без сортировки всей выборки
+    assert "TEMP B-TREE" not in plan, plan
@@ -0,0 +1,96 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# Отдельная SQLite база теста: движок создается при импорте database
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "comments_queries.db")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from database import engine, async_read_engine, Base, SessionLocal, User, Startup, Comment
+from backend import app
+
+AUTHORS = 5
+COMMENTS = 25
+
+
+@pytest.fixture(scope="module")
+def startup_id():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    users = [
+        User(email=f"author{i}@example.com", password_hash="x", name=f"Author {i}", role="investor")
+        for i in range(AUTHORS)
+    ]
+    db.add_all(users)
+    db.flush()
+    startup = Startup(
+        name="Commented", description="x" * 60, stage="mvp", category="FinTech",
+        telegram_contact="@commented", owner_id=users[0].id, comments_count=COMMENTS
+    )
+    db.add(startup)
+    db.flush()
+    now = datetime.utcnow()
+    db.add_all([
+        Comment(
+            content=f"comment {i}", author_id=users[i % AUTHORS].id, startup_id=startup.id,
+            # Одинаковое время у пар комментариев: порядок держится на id
+            created_at=now - timedelta(minutes=i // 2)
+        )
+        for i in range(COMMENTS)
+    ])
+    db.commit()
+    startup_id = startup.id
+    db.close()
+    yield startup_id
+    Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def statements():
+    """SQL-запросы к базе чтения во время теста"""
+    executed = []
+    
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    
+    event.listen(async_read_engine.sync_engine, "before_cursor_execute", count)
+    yield executed
+    event.remove(async_read_engine.sync_engine, "before_cursor_execute", count)
+
+
+# Без with: фоновые сервисы приложения не запускаются и не добавляют своих запросов
+client = TestClient(app)
+
+
+def test_comments_page_query_count_does_not_depend_on_authors(startup_id, statements):
+    response = client.get(f"/api/startups/{startup_id}/comments?limit=20")
+    
+    assert response.status_code == 200, response.text
+    page = response.json()
+    assert len(page["comments"]) == 20
+    assert {comment["author_name"] for comment in page["comments"]} == {f"Author {i}" for i in range(AUTHORS)}
+    # Комментарии с авторами и счетчик стартапа - без запроса на каждого автора
+    assert len(statements) == 2, statements
+
+
+def test_cursor_walk_matches_offset_order(startup_id, statements):
+    full = client.get(f"/api/startups/{startup_id}/comments?limit=100").json()
+    
+    walked, cursor = [], None
+    while True:
+        statements.clear()
+        url = f"/api/startups/{startup_id}/comments?limit=7" + (f"&cursor={cursor}" if cursor else "")
+        page = client.get(url).json()
+        assert len(statements) == 2, statements
+        walked.extend(comment["id"] for comment in page["comments"])
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    
+    assert walked == [comment["id"] for comment in full["comments"]]
+    assert len(walked) == COMMENTS
+    assert full["total"] == COMMENTS
@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# Отдельная SQLite база теста: движок создается при импорте database
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "telegram_client.db")
+
+from database import engine, async_engine, Base, SessionLocal, User, NotificationOutbox
+from telegram_client import TelegramClient, TelegramSender, TelegramAPIError, FakeTelegramServer
+from worker import NotificationDispatcher
+
+
+class BadGatewayServer(FakeTelegramServer):
+    """Заглушка, перед которой стоит прокси: чату 502 отвечает HTML-страницей"""
+    
+    def handle_send_message(self, payload):
+        if str(payload.get("chat_id")) == "502":
+            return 502, "<html><body><h1>502 Bad Gateway</h1></body></html>"
+        return super().handle_send_message(payload)
+
+
+class CrashingSender(TelegramSender):
+    """Отправитель с непредвиденной ошибкой для одного чата"""
+    
+    async def send(self, chat_id, text):
+        if str(chat_id) == "500":
+            raise RuntimeError("unexpected failure")
+        return await super().send(chat_id, text)
+
+
+@pytest.fixture
+def fake():
+    with BadGatewayServer(fail_chat_ids=["403"], throttle={"429": 1000}) as server:
+        yield server
+
+
+def send_all(sender: TelegramSender, messages):
+    """Параллельная отправка [(chat_id, text)]; возвращает (результаты, секунды)"""
+    async def run():
+        started = time.monotonic()
+        try:
+            results = await asyncio.gather(
+                *[sender.send(chat_id, text) for chat_id, text in messages],
+                return_exceptions=True
+            )
+        finally:
+            await sender.close()
+        return results, time.monotonic() - started
+    return asyncio.run(run())
+
+
+def test_per_chat_limit_spaces_messages_to_one_chat(fake):
+    sender = TelegramSender(TelegramClient("test", fake.url), global_rate=1000, chat_rate=20)
+    
+    results, elapsed = send_all(sender, [("1", f"message {i}") for i in range(4)])
+    
+    assert not [result for result in results if isinstance(result, Exception)]
+    # Емкость бакета чата - 1: после первого сообщения по одному в 1/20 с
+    assert elapsed >= 3 / 20 * 0.9
+    assert [message["text"] for message in fake.sent_messages] == [f"message {i}" for i in range(4)]
+
+
+def test_per_chat_limit_does_not_slow_other_chats(fake):
+    sender = TelegramSender(TelegramClient("test", fake.url), global_rate=1000, chat_rate=1)
+    
+    results, elapsed = send_all(sender, [(str(chat_id), "hello") for chat_id in range(1, 6)])
+    
+    assert not [result for result in results if isinstance(result, Exception)]
+    assert elapsed < 0.5
+    assert len(fake.sent_messages) == 5
+
+
+def test_global_limit_caps_bot_throughput(fake):
+    sender = TelegramSender(TelegramClient("test", fake.url), global_rate=10, chat_rate=1000)
+    
+    results, elapsed = send_all(sender, [(str(chat_id), "hello") for chat_id in range(1, 16)])
+    
+    assert not [result for result in results if isinstance(result, Exception)]
+    # Первые 10 - запас бакета, остальные 5 - по одному в 1/10 с
+    assert elapsed >= 5 / 10 * 0.9
+    assert len(fake.sent_messages) == 15
+
+
+def test_429_waits_retry_after_and_resends():
+    with FakeTelegramServer(throttle={"42": 1}, retry_after=1) as server:
+        sender = TelegramSender(TelegramClient("test", server.url), max_retries=3)
+        
+        results, elapsed = send_all(sender, [("42", "hello")])
+        
+        assert results[0]["chat"]["id"] == "42"
+        assert elapsed >= 0.9
+        assert server.rate_limited == 1
+        assert len(server.sent_messages) == 1
+        assert sender.metrics["rate_limited"] == 1
+        assert sender.metrics["sent"] == 1
+
+
+def test_429_raises_when_retries_exhausted(fake):
+    sender = TelegramSender(TelegramClient("test", fake.url), max_retries=0)
+    
+    results, _ = send_all(sender, [("429", "hello")])
+    
+    assert isinstance(results[0], TelegramAPIError)
+    assert results[0].status_code == 429
+    assert results[0].retry_after == 1
+    assert sender.metrics["failed"] == 1
+
+
+def test_non_json_error_body_is_api_error(fake):
+    sender = TelegramSender(TelegramClient("test", fake.url))
+    
+    results, _ = send_all(sender, [("502", "hello")])
+    
+    assert isinstance(results[0], TelegramAPIError)
+    assert results[0].status_code == 502
+    assert "Bad Gateway" in results[0].description
+
+
+# ==================== ДИСПЕТЧЕР ====================
+
+# telegram_id получателя -> ожидаемый статус строки outbox после одного цикла
+RECIPIENTS = {
+    "100": "sent",
+    "403": "failed",  # бот заблокирован - повтор не поможет
+    "429": "pending",  # повторы отправителя исчерпаны - повтор после retry_after
+    "502": "pending",  # HTML от прокси вместо ответа Bot API
+    "500": "pending",  # непредвиденная ошибка не теряет результаты остальных
+    None: "skipped"  # Telegram не привязан
+}
+
+
+@pytest.fixture
+def outbox():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    ids = {}
+    for number, telegram_id in enumerate(RECIPIENTS):
+        user = User(
+            email=f"user{number}@example.com", password_hash="x", role="investor",
+            telegram_id=telegram_id, telegram_linked=telegram_id is not None
+        )
+        db.add(user)
+        db.flush()
+        notification = NotificationOutbox(user_id=user.id, message=f"notification for {telegram_id}")
+        db.add(notification)
+        db.flush()
+        ids[telegram_id] = notification.id
+    db.commit()
+    db.close()
+    yield ids
+    Base.metadata.drop_all(engine)
+
+
+def test_dispatcher_writes_back_every_result(fake, outbox):
+    async def run():
+        sender = CrashingSender(TelegramClient("test", fake.url), max_retries=0)
+        try:
+            return await NotificationDispatcher(sender).dispatch_once()
+        finally:
+            await sender.close()
+            await async_engine.dispose()
+    
+    started = datetime.utcnow()
+    assert asyncio.run(run()) == len(RECIPIENTS)
+    
+    db = SessionLocal()
+    rows = {row.id: row for row in db.query(NotificationOutbox).all()}
+    db.close()
+    for telegram_id, expected in RECIPIENTS.items():
+        row = rows[outbox[telegram_id]]
+        assert row.status == expected, (telegram_id, row.status, row.last_error)
+        assert row.attempts == 1
+    
+    assert rows[outbox["100"]].sent_at is not None
+    assert [message["text"] for message in fake.sent_messages] == ["notification for 100"]
+    assert "chat not found" in rows[outbox["403"]].last_error
+    assert "RuntimeError" in rows[outbox["500"]].last_error
+    # 429 - повтор через retry_after, остальные повторы - с экспоненциальной задержкой
+    assert rows[outbox["429"]].available_at < started + timedelta(seconds=5)
+    assert rows[outbox["502"]].available_at > started + timedelta(seconds=5)
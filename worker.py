@@ -0,0 +1,836 @@
+import os
+import time
+import socket
+import asyncio
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Callable, Awaitable
+
+import httpx
+from sqlalchemy import select, update, delete, bindparam, or_, and_, func, text, case
+from sqlalchemy import exc as sa_exc
+
+from database import AsyncSessionLocal, User, Startup, AIAnalysis, AnalyticsEvent, TelegramEvent, NotificationOutbox, RematchJob, Job, get_job_queue_stats
+from database import AnalyticsRollupHourly, AnalyticsRollupDaily, ANALYTICS_ROLLUPS, truncate_time, truncate_column, rollup_upsert
+from database import EVENTS_PARTITIONED, month_start, list_event_partitions, create_event_partitions
+from database import Like, Comment, StartupCounterShard, STARTUP_COUNTERS
+from telegram_client import TelegramSender, TelegramAPIError
+from matching import matching_index, score_candidate, merge_match, replace_match_feed, MATCH_TOP_K
+
+# Настройки диспетчера уведомлений
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))  # секунды
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_DELAY = int(os.getenv("OUTBOX_RETRY_DELAY", "30"))  # база экспоненциальной задержки, секунды
+OUTBOX_CLAIM_TIMEOUT = int(os.getenv("OUTBOX_CLAIM_TIMEOUT", "300"))  # через сколько зависшая пачка берется снова
+OUTBOX_METRICS_INTERVAL = float(os.getenv("OUTBOX_METRICS_INTERVAL", "60"))  # период вывода метрик, секунды
+
+# Настройки пересчета мэтчинга
+REMATCH_BATCH_SIZE = int(os.getenv("REMATCH_BATCH_SIZE", "200"))  # стартапов за одну транзакцию
+REMATCH_POLL_INTERVAL = float(os.getenv("REMATCH_POLL_INTERVAL", "5"))  # секунды
+REMATCH_MAX_ATTEMPTS = int(os.getenv("REMATCH_MAX_ATTEMPTS", "5"))
+REMATCH_CLAIM_TIMEOUT = int(os.getenv("REMATCH_CLAIM_TIMEOUT", "600"))  # через сколько зависшее задание берется снова
+
+# Настройки очереди заданий
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))  # одновременно выполняемых заданий
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # секунды
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", "10"))  # база экспоненциальной задержки, секунды
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "600"))  # через сколько зависшее задание берется снова
+
+# Пересчет агрегатов аналитики
+ROLLUP_BACKFILL_BATCH_SIZE = int(os.getenv("ROLLUP_BACKFILL_BATCH_SIZE", "100"))  # стартапов за одну транзакцию
+
+# Хранение сырых событий (python worker.py retention - раз в сутки)
+EVENT_RETENTION_MONTHS = int(os.getenv("EVENT_RETENTION_MONTHS", "6"))  # полных месяцев сырых событий
+ANALYTICS_HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "90"))  # суточные агрегаты - бессрочно
+
+# Счетчики стартапов
+COUNTER_FOLD_INTERVAL = float(os.getenv("COUNTER_FOLD_INTERVAL", "10"))  # секунды
+COUNTER_FOLD_BATCH_SIZE = int(os.getenv("COUNTER_FOLD_BATCH_SIZE", "1000"))  # слотов за одну транзакцию
+COUNTER_RECONCILE_BATCH_SIZE = int(os.getenv("COUNTER_RECONCILE_BATCH_SIZE", "1000"))  # стартапов за одну транзакцию
+
+
+# ==================== ДИСПЕТЧЕР УВЕДОМЛЕНИЙ ====================
+
+class NotificationDispatcher:
+    """Доставка уведомлений из outbox в Telegram пачками"""
+    
+    def __init__(self, sender: TelegramSender, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.sender = sender
+        self.batch_size = batch_size
+        self.stats = {"sent": 0, "skipped": 0, "retried": 0, "failed": 0}
+    
+    async def claim_batch(self) -> List[NotificationOutbox]:
+        """Захват пачки уведомлений (SKIP LOCKED - несколько диспетчеров не мешают друг другу)"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            notifications = (await db.scalars(
+                select(NotificationOutbox)
+                .where(or_(
+                    and_(NotificationOutbox.status == "pending", NotificationOutbox.available_at <= now),
+                    # Пачки упавшего диспетчера
+                    and_(
+                        NotificationOutbox.status == "processing",
+                        NotificationOutbox.claimed_at < now - timedelta(seconds=OUTBOX_CLAIM_TIMEOUT)
+                    )
+                ))
+                .order_by(NotificationOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            
+            for notification in notifications:
+                notification.status = "processing"
+                notification.claimed_at = now
+                notification.attempts = (notification.attempts or 0) + 1
+            await db.commit()
+            return notifications
+    
+    async def deliver(self, notification: NotificationOutbox, user) -> Dict[str, Any]:
+        """Отправка одного уведомления; возвращает новое состояние строки outbox"""
+        if not user or not user.telegram_linked or not user.telegram_id:
+            return {"status": "skipped", "error": "Telegram не привязан"}
+        
+        try:
+            await self.sender.send(user.telegram_id, notification.message)
+            return {"status": "sent", "error": None}
+        except TelegramAPIError as e:
+            # 400/403 - чат не найден или бот заблокирован: повтор не поможет
+            if e.status_code in (400, 403):
+                return {"status": "failed", "error": str(e)}
+            return self.retry_state(notification, str(e), e.retry_after)
+        except httpx.HTTPError as e:
+            return self.retry_state(notification, f"{type(e).__name__}: {e}")
+        except Exception as e:
+            # Непредвиденная ошибка одного уведомления не должна терять результаты всей пачки:
+            # уже отправленные остались бы в processing и ушли повторно после OUTBOX_CLAIM_TIMEOUT
+            return self.retry_state(notification, f"{type(e).__name__}: {e}")
+    
+    def retry_state(self, notification: NotificationOutbox, error: str, retry_after: Optional[float] = None) -> Dict[str, Any]:
+        if notification.attempts >= OUTBOX_MAX_ATTEMPTS:
+            return {"status": "failed", "error": error}
+        delay = retry_after or OUTBOX_RETRY_DELAY * 2 ** (notification.attempts - 1)
+        return {"status": "pending", "error": error, "available_at": datetime.utcnow() + timedelta(seconds=delay)}
+    
+    async def dispatch_once(self) -> int:
+        """Один цикл: захват пачки, отправка, запись результатов; возвращает размер пачки"""
+        notifications = await self.claim_batch()
+        if not notifications:
+            return 0
+        
+        async with AsyncSessionLocal() as db:
+            # Получатели пачки - одним запросом
+            users = {
+                user.id: user
+                for user in (await db.execute(
+                    select(User.id, User.telegram_id, User.telegram_username, User.telegram_linked)
+                    .where(User.id.in_({notification.user_id for notification in notifications}))
+                )).all()
+            }
+            
+            # Отправка пачки параллельно; лимиты Telegram соблюдает TelegramSender
+            results = await asyncio.gather(*[
+                self.deliver(notification, users.get(notification.user_id))
+                for notification in notifications
+            ])
+            
+            now = datetime.utcnow()
+            updates = []
+            events = []
+            for notification, result in zip(notifications, results):
+                user = users.get(notification.user_id)
+                updates.append({
+                    "b_id": notification.id,
+                    "b_status": result["status"],
+                    "b_error": result["error"],
+                    "b_available_at": result.get("available_at", notification.available_at),
+                    "b_sent_at": now if result["status"] == "sent" else None
+                })
+                self.stats["retried" if result["status"] == "pending" else result["status"]] += 1
+                
+                if result["status"] == "sent":
+                    # Лог факта отправки (без полного текста сообщения)
+                    events.append({
+                        "event_type": "notification_sent",
+                        "user_id": notification.user_id,
+                        "metadata": {
+                            "message_type": "notification",
+                            "timestamp": now.isoformat(),
+                            "user_telegram": user.telegram_username,
+                            "message_preview": notification.message[:100],
+                            "outbox_id": notification.id
+                        },
+                        "created_at": now
+                    })
+            
+            outbox = NotificationOutbox.__table__
+            await db.execute(
+                update(outbox)
+                .where(outbox.c.id == bindparam("b_id"))
+                .values(
+                    status=bindparam("b_status"),
+                    last_error=bindparam("b_error"),
+                    available_at=bindparam("b_available_at"),
+                    sent_at=bindparam("b_sent_at")
+                ),
+                updates
+            )
+            if events:
+                await db.execute(TelegramEvent.__table__.insert(), events)
+            await db.commit()
+        
+        return len(notifications)
+
+
+async def run_notification_dispatcher():
+    """Цикл диспетчера: пачки подряд, пока очередь не опустеет, затем ожидание"""
+    sender = TelegramSender()
+    dispatcher = NotificationDispatcher(sender)
+    print("📨 Диспетчер уведомлений запущен")
+    metrics_at = time.monotonic()
+    try:
+        while True:
+            try:
+                processed = await dispatcher.dispatch_once()
+            except Exception as e:
+                print(f"Ошибка в диспетчере уведомлений: {e}")
+                processed = 0
+            
+            if time.monotonic() - metrics_at >= OUTBOX_METRICS_INTERVAL:
+                print(f"📊 Уведомления: {dispatcher.stats}, Telegram: {sender.get_metrics()}")
+                metrics_at = time.monotonic()
+            
+            if processed < dispatcher.batch_size:
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+    finally:
+        await sender.close()
+
+
+# ==================== ПЕРЕСЧЕТ МЭТЧИНГА ====================
+
+class ProfileRematcher:
+    """Обновление списков мэтчинга стартапов, затронутых изменением профиля"""
+    
+    # Роль -> (колонка AIAnalysis со списком id, ключ в match_reasons)
+    FIELDS = {"investor": ("matched_investors", "investors"), "mentor": ("matched_mentors", "mentors")}
+    
+    def __init__(self, batch_size: int = REMATCH_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.stats = {"jobs": 0, "failed": 0, "startups": 0, "updated": 0, "reranked": 0}
+    
+    async def claim_job(self) -> Optional[int]:
+        """Захват одного задания (SKIP LOCKED); зависшие задания упавшего воркера берутся снова"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            job = await db.scalar(
+                select(RematchJob)
+                .where(or_(
+                    RematchJob.status == "pending",
+                    and_(
+                        RematchJob.status == "running",
+                        RematchJob.claimed_at < now - timedelta(seconds=REMATCH_CLAIM_TIMEOUT)
+                    )
+                ))
+                .order_by(RematchJob.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            if job is None:
+                return None
+            job.status = "running"
+            job.claimed_at = now
+            job.attempts = (job.attempts or 0) + 1
+            await db.commit()
+            return job.id
+    
+    async def run_job(self, job_id: int):
+        """Обработка задания пачками; чекпоинт коммитится вместе с обновленными списками"""
+        async with AsyncSessionLocal() as db:
+            job = await db.get(RematchJob, job_id)
+            try:
+                # Свежий профиль: индекс этого процесса мог его еще не видеть
+                user = await db.get(User, job.user_id)
+                if user:
+                    matching_index.update_user(user)
+                else:
+                    matching_index.remove_user(job.user_id)
+                await matching_index.ensure_fresh(db)
+                candidate = matching_index.candidate_matrix(user) if user else None
+                
+                while await self.process_batch(db, job, candidate):
+                    pass
+                
+                job.status = "done"
+                job.finished_at = datetime.utcnow()
+                job.last_error = None
+                await db.commit()
+                self.stats["jobs"] += 1
+            except Exception as e:
+                print(f"Ошибка при пересчете мэтчинга (задание {job_id}): {e}")
+                await db.rollback()
+                # Чекпоинт сохранен последним коммитом - повтор продолжит с него
+                job = await db.get(RematchJob, job_id)
+                job.status = "failed" if job.attempts >= REMATCH_MAX_ATTEMPTS else "pending"
+                job.last_error = str(e)
+                await db.commit()
+                self.stats["failed"] += 1
+    
+    async def process_batch(self, db, job: RematchJob, candidate) -> bool:
+        """Одна пачка затронутых стартапов после чекпоинта; False - стартапы закончились"""
+        field, reasons_key = self.FIELDS[job.role]
+        conditions = []
+        if job.categories:
+            conditions.append(Startup.category.in_(job.categories))
+        if job.regions:
+            conditions.append(Startup.region.in_(job.regions))
+        if not conditions:
+            return False
+        
+        rows = (await db.execute(
+            select(AIAnalysis, Startup.id, Startup.category, Startup.region, Startup.investment_asked)
+            .join(Startup, Startup.id == AIAnalysis.startup_id)
+            .where(
+                Startup.is_published == True,
+                Startup.is_approved == True,
+                or_(*conditions),
+                Startup.id > job.last_startup_id
+            )
+            .order_by(Startup.id)
+            .limit(self.batch_size)
+        )).all()
+        if not rows:
+            return False
+        
+        for row in rows:
+            analysis = row.AIAnalysis
+            ids = list(getattr(analysis, field) or [])
+            reasons = dict(analysis.match_reasons) if isinstance(analysis.match_reasons, dict) else {}
+            matches = [item for item in reasons.get(reasons_key) or [] if isinstance(item, dict)]
+            match = score_candidate(candidate, job.role, row) if candidate is not None else None
+            listed = job.user_id in ids
+            if not listed and match is None:
+                continue
+            
+            if len(matches) != len(ids) or (listed and match is None and len(ids) >= MATCH_TOP_K):
+                # Список без оценок (старый формат) или из полного топа выбыл кандидат - полный пересчет
+                matches = matching_index.rank(job.role, row)
+                self.stats["reranked"] += 1
+            else:
+                matches = merge_match(matches, job.user_id, match)
+            
+            reasons[reasons_key] = matches
+            setattr(analysis, field, [item["id"] for item in matches])
+            analysis.match_reasons = reasons
+            await replace_match_feed(db, row.id, {job.role: matches})
+            self.stats["updated"] += 1
+        
+        job.last_startup_id = rows[-1].id
+        job.processed = (job.processed or 0) + len(rows)
+        self.stats["startups"] += len(rows)
+        await db.commit()
+        return len(rows) == self.batch_size
+
+
+async def run_profile_rematcher():
+    """Цикл пересчета: задания по одному, пока очередь не опустеет, затем ожидание"""
+    rematcher = ProfileRematcher()
+    print("🎯 Пересчет мэтчинга запущен")
+    metrics_at = time.monotonic()
+    while True:
+        try:
+            job_id = await rematcher.claim_job()
+            if job_id is not None:
+                await rematcher.run_job(job_id)
+        except Exception as e:
+            print(f"Ошибка в пересчете мэтчинга: {e}")
+            job_id = None
+        
+        if time.monotonic() - metrics_at >= OUTBOX_METRICS_INTERVAL:
+            print(f"📊 Пересчет мэтчинга: {rematcher.stats}")
+            metrics_at = time.monotonic()
+        
+        if job_id is None:
+            await asyncio.sleep(REMATCH_POLL_INTERVAL)
+
+
+async def rebuild_match_feed(batch_size: int = REMATCH_BATCH_SIZE):
+    """Заполнение ленты из сохраненных результатов мэтчинга (для существующих данных)"""
+    last_id = 0
+    total = 0
+    async with AsyncSessionLocal() as db:
+        await matching_index.ensure_fresh(db)
+        while True:
+            rows = (await db.execute(
+                select(AIAnalysis, Startup.id, Startup.category, Startup.region, Startup.investment_asked)
+                .join(Startup, Startup.id == AIAnalysis.startup_id)
+                .where(Startup.id > last_id)
+                .order_by(Startup.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            
+            for row in rows:
+                analysis = row.AIAnalysis
+                reasons = dict(analysis.match_reasons) if isinstance(analysis.match_reasons, dict) else {}
+                matches_by_role = {}
+                for role, (field, reasons_key) in ProfileRematcher.FIELDS.items():
+                    matches = [item for item in reasons.get(reasons_key) or [] if isinstance(item, dict)]
+                    if len(matches) != len(getattr(analysis, field) or []):
+                        # Старый формат без оценок - пересчитываем
+                        matches = matching_index.rank(role, row)
+                        reasons[reasons_key] = matches
+                        setattr(analysis, field, [item["id"] for item in matches])
+                    matches_by_role[role] = matches
+                analysis.match_reasons = reasons
+                await replace_match_feed(db, row.id, matches_by_role)
+            
+            await db.commit()
+            last_id = rows[-1].id
+            total += len(rows)
+    print(f"✅ Лента мэтчинга перестроена: {total} стартапов")
+
+
+# ==================== ОЧЕРЕДЬ ЗАДАНИЙ ====================
+
+async def handle_startup_matching(payload: Dict[str, Any]):
+    # Импорт здесь: модуль API нужен только процессу, выполняющему задания
+    from backend import run_startup_matching
+    await run_startup_matching(payload["startup_id"])
+
+
+# Вид задания -> обработчик payload
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {
+    "startup_matching": handle_startup_matching
+}
+
+
+class JobWorker:
+    """Выполнение заданий из очереди с ограничением параллелизма и повторами"""
+    
+    def __init__(self, handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]], concurrency: int = JOB_CONCURRENCY):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.stats = {"done": 0, "retried": 0, "failed": 0}
+        self._running = set()
+    
+    async def claim(self, limit: int) -> List[Job]:
+        """Захват до limit заданий (SKIP LOCKED на Postgres, условный UPDATE - защита от двойного захвата на SQLite)"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            candidates = (await db.execute(
+                select(Job.id, Job.status, Job.locked_at)
+                .where(
+                    Job.kind.in_(list(self.handlers)),
+                    or_(
+                        and_(Job.status == "pending", Job.run_at <= now),
+                        # Задания упавшего воркера
+                        and_(Job.status == "running", Job.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT))
+                    )
+                )
+                .order_by(Job.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )).all()
+            
+            claimed = []
+            for candidate in candidates:
+                result = await db.execute(
+                    update(Job)
+                    .where(
+                        Job.id == candidate.id,
+                        Job.status == candidate.status,
+                        Job.locked_at.is_not_distinct_from(candidate.locked_at)
+                    )
+                    .values(status="running", locked_at=now, locked_by=self.name, attempts=Job.attempts + 1)
+                )
+                if result.rowcount:
+                    claimed.append(candidate.id)
+            await db.commit()
+            
+            if not claimed:
+                return []
+            return (await db.scalars(select(Job).where(Job.id.in_(claimed)).order_by(Job.id))).all()
+    
+    async def execute(self, job: Job):
+        """Выполнение задания и запись результата; при ошибке - повтор с экспоненциальной задержкой"""
+        values = {"locked_at": None, "locked_by": None}
+        try:
+            await self.handlers[job.kind](job.payload or {})
+            values.update(status="done", finished_at=datetime.utcnow(), last_error=None)
+            self.stats["done"] += 1
+        except Exception as e:
+            print(f"Ошибка при выполнении задания {job.kind} #{job.id}: {e}")
+            if job.attempts >= (job.max_attempts or 1):
+                values.update(status="failed", finished_at=datetime.utcnow(), last_error=str(e))
+                self.stats["failed"] += 1
+            else:
+                delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+                values.update(status="pending", run_at=datetime.utcnow() + timedelta(seconds=delay), last_error=str(e))
+                self.stats["retried"] += 1
+        
+        async with AsyncSessionLocal() as db:
+            try:
+                await db.execute(update(Job).where(Job.id == job.id, Job.locked_by == self.name).values(**values))
+                await db.commit()
+            except sa_exc.IntegrityError:
+                # В очереди уже ждет задание с тем же ключом дедупликации - повтор выполнит оно
+                await db.rollback()
+                await db.execute(update(Job).where(Job.id == job.id).values(
+                    status="done", finished_at=datetime.utcnow(), locked_at=None, locked_by=None,
+                    last_error=f"{values['last_error']} (повтор передан ожидающему заданию)"
+                ))
+                await db.commit()
+    
+    async def run_once(self) -> int:
+        """Заполнение свободных слотов новыми заданиями; возвращает число запущенных"""
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return 0
+        jobs = await self.claim(free)
+        for job in jobs:
+            task = asyncio.create_task(self.execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        return len(jobs)
+    
+    async def drain(self):
+        """Ожидание завершения запущенных заданий"""
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+
+async def run_job_worker(concurrency: int = JOB_CONCURRENCY):
+    """Цикл воркера: забирает задания, пока есть свободные слоты, затем ожидание"""
+    worker = JobWorker(JOB_HANDLERS, concurrency)
+    print(f"⚙️ Воркер заданий {worker.name} запущен (параллельно: {concurrency})")
+    metrics_at = time.monotonic()
+    try:
+        while True:
+            try:
+                started = await worker.run_once()
+            except Exception as e:
+                print(f"Ошибка в воркере заданий: {e}")
+                started = 0
+            
+            if time.monotonic() - metrics_at >= OUTBOX_METRICS_INTERVAL:
+                async with AsyncSessionLocal() as db:
+                    queue = await get_job_queue_stats(db)
+                print(f"📊 Задания: {worker.stats}, выполняется: {len(worker._running)}, очередь: {queue}")
+                metrics_at = time.monotonic()
+            
+            if not started:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+    finally:
+        await worker.drain()
+
+
+# ==================== АГРЕГАТЫ АНАЛИТИКИ ====================
+
+def rollup_horizon(granularity: str, now: datetime) -> datetime:
+    """Начало агрегатов, которые еще можно пересчитать из сырых событий"""
+    # Более ранние сырые события удалены (а перед этим свернуты в суточные агрегаты) задачей хранения
+    horizon = month_start(now, -EVENT_RETENTION_MONTHS)
+    if granularity == "hour":
+        horizon = max(horizon, truncate_time(now - timedelta(days=ANALYTICS_HOURLY_RETENTION_DAYS), "day"))
+    return horizon
+
+
+async def recompute_rollups(db, model, granularity: str, events_filter, rollups_filter):
+    """Замена строк агрегата (rollups_filter) пересчетом из сырых событий (events_filter), без коммита"""
+    bucket = truncate_column(AnalyticsEvent.created_at, granularity)
+    user_role = func.coalesce(AnalyticsEvent.user_role, "")
+    await db.execute(delete(model.__table__).where(rollups_filter))
+    # Upsert, а не insert: событие, записанное параллельно, уже прибавило свою строку агрегата
+    # и не видно этому запросу до коммита - его вклад сохраняется
+    await db.execute(rollup_upsert(
+        model,
+        select(AnalyticsEvent.startup_id, AnalyticsEvent.event_type, user_role, bucket, func.count())
+        .where(events_filter)
+        .group_by(AnalyticsEvent.startup_id, AnalyticsEvent.event_type, user_role, bucket)
+    ))
+
+
+async def backfill_analytics_rollups(batch_size: int = ROLLUP_BACKFILL_BATCH_SIZE):
+    """Пересчет почасовых и суточных агрегатов из сырых событий (для существующих данных)"""
+    last_id = 0
+    total = 0
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        while True:
+            startup_ids = (await db.scalars(
+                select(Startup.id).where(Startup.id > last_id).order_by(Startup.id).limit(batch_size)
+            )).all()
+            if not startup_ids:
+                break
+            
+            for model, granularity in ANALYTICS_ROLLUPS.items():
+                since = rollup_horizon(granularity, now)
+                await recompute_rollups(
+                    db, model, granularity,
+                    and_(AnalyticsEvent.startup_id.in_(startup_ids), AnalyticsEvent.created_at >= since),
+                    and_(model.startup_id.in_(startup_ids), model.bucket >= since)
+                )
+            
+            await db.commit()
+            last_id = startup_ids[-1]
+            total += len(startup_ids)
+    print(f"✅ Агрегаты аналитики пересчитаны: {total} стартапов")
+
+
+# ==================== ХРАНЕНИЕ СОБЫТИЙ ====================
+
+async def delete_by_day(db, table, column, cutoff: datetime, before_delete=None) -> int:
+    """Удаление строк с column < cutoff посуточно (транзакция на сутки, без одного большого DELETE)"""
+    deleted = 0
+    while True:
+        oldest = await db.scalar(select(func.min(column)).where(column < cutoff))
+        if oldest is None:
+            return deleted
+        start = truncate_time(oldest, "day")
+        end = min(start + timedelta(days=1), cutoff)
+        if before_delete:
+            await before_delete(start, end)
+        result = await db.execute(delete(table).where(column >= start, column < end))
+        await db.commit()
+        deleted += result.rowcount
+
+
+async def drop_expired_partitions(db, table: str, cutoff: datetime, before_drop=None) -> List[str]:
+    """Удаление месячных секций, целиком лежащих до cutoff (Postgres): DROP TABLE вместо DELETE"""
+    dropped = []
+    for name, end in await db.run_sync(list_event_partitions, table):
+        if end > cutoff:
+            break
+        if before_drop:
+            await before_drop(end)
+        await db.execute(text(f"DROP TABLE {name}"))
+        await db.commit()
+        dropped.append(name)
+    return dropped
+
+
+async def run_event_retention():
+    """Хранение событий: секции вперед, истекшие сырые события - в суточные агрегаты и удаление"""
+    now = datetime.utcnow()
+    cutoff = month_start(now, -EVENT_RETENTION_MONTHS)
+    
+    async with AsyncSessionLocal() as db:
+        async def compact(start: datetime, end: datetime):
+            # Суточные агрегаты истекшего периода - окончательно из сырых событий, в транзакции удаления
+            await recompute_rollups(
+                db, AnalyticsRollupDaily, "day",
+                and_(AnalyticsEvent.created_at >= start, AnalyticsEvent.created_at < end),
+                and_(AnalyticsRollupDaily.bucket >= start, AnalyticsRollupDaily.bucket < end)
+            )
+        
+        async def compact_partition(end: datetime):
+            oldest = await db.scalar(select(func.min(AnalyticsEvent.created_at)).where(AnalyticsEvent.created_at < end))
+            if oldest is not None:
+                await compact(truncate_time(oldest, "day"), end)
+        
+        dropped = []
+        if EVENTS_PARTITIONED:
+            await db.run_sync(create_event_partitions)
+            await db.commit()
+            dropped += await drop_expired_partitions(db, "analytics_events", cutoff, compact_partition)
+            dropped += await drop_expired_partitions(db, "telegram_events", cutoff)
+        
+        # Без секций (SQLite) и остатки в секциях по умолчанию - посуточно
+        analytics_deleted = await delete_by_day(db, AnalyticsEvent.__table__, AnalyticsEvent.created_at, cutoff, compact)
+        telegram_deleted = await delete_by_day(db, TelegramEvent.__table__, TelegramEvent.created_at, cutoff)
+        hourly_deleted = await delete_by_day(
+            db, AnalyticsRollupHourly.__table__, AnalyticsRollupHourly.bucket, rollup_horizon("hour", now)
+        )
+    
+    print(f"✅ Хранение событий до {cutoff:%Y-%m-%d}: удалены секции {dropped or '-'}, "
+          f"analytics_events: {analytics_deleted}, telegram_events: {telegram_deleted}, "
+          f"почасовых агрегатов: {hourly_deleted}")
+
+
+# ==================== СЧЕТЧИКИ СТАРТАПОВ ====================
+
+async def fold_counter_shards(batch_size: int = COUNTER_FOLD_BATCH_SIZE) -> int:
+    """Перенос приращений из слотов горячих стартапов в startups с ростом версии карточки; возвращает число слотов"""
+    shards = StartupCounterShard.__table__
+    startups = Startup.__table__
+    async with AsyncSessionLocal() as db:
+        # FOR UPDATE: параллельный запуск ждет, а не переносит те же приращения повторно
+        rows = (await db.execute(
+            select(shards)
+            .order_by(shards.c.startup_id, shards.c.slot)
+            .limit(batch_size)
+            .with_for_update()
+        )).all()
+        if not rows:
+            return 0
+        
+        totals = {}
+        for row in rows:
+            total = totals.setdefault(row.startup_id, Counter())
+            for name in STARTUP_COUNTERS:
+                total[name] += getattr(row, name)
+        
+        now = datetime.utcnow()
+        await db.execute(
+            update(startups)
+            .where(startups.c.id == bindparam("b_startup_id"))
+            .values(
+                version=startups.c.version + bindparam("b_version_step"),
+                # Last-Modified меняется вместе с версией
+                updated_at=case((bindparam("b_version_step") > 0, now), else_=startups.c.updated_at),
+                **{name: func.coalesce(startups.c[name], 0) + bindparam(f"b_{name}") for name in STARTUP_COUNTERS}
+            ),
+            [
+                {
+                    "b_startup_id": startup_id,
+                    # Как и при прямом обновлении: одни просмотры версию не меняют
+                    "b_version_step": 1 if any(total[name] for name in STARTUP_COUNTERS if name != "views_count") else 0,
+                    **{f"b_{name}": total[name] for name in STARTUP_COUNTERS}
+                }
+                for startup_id, total in sorted(totals.items())
+            ]
+        )
+        # Вычитаем перенесенное, а не удаляем слоты: приращения, записанные после выборки, сохраняются
+        await db.execute(
+            update(shards)
+            .where(shards.c.startup_id == bindparam("b_startup_id"), shards.c.slot == bindparam("b_slot"))
+            .values({name: shards.c[name] - bindparam(f"b_{name}") for name in STARTUP_COUNTERS}),
+            [
+                {"b_startup_id": row.startup_id, "b_slot": row.slot, **{f"b_{name}": getattr(row, name) for name in STARTUP_COUNTERS}}
+                for row in rows
+            ]
+        )
+        await db.execute(delete(shards).where(
+            shards.c.startup_id.in_(list(totals)),
+            *(shards.c[name] == 0 for name in STARTUP_COUNTERS)
+        ))
+        await db.commit()
+        return len(rows)
+
+
+async def run_counter_folder():
+    """Цикл сворачивания слотов счетчиков горячих стартапов"""
+    print("🔢 Сворачивание счетчиков запущено")
+    while True:
+        try:
+            folded = await fold_counter_shards()
+        except Exception as e:
+            print(f"Ошибка при сворачивании счетчиков: {e}")
+            folded = 0
+        
+        if folded < COUNTER_FOLD_BATCH_SIZE:
+            await asyncio.sleep(COUNTER_FOLD_INTERVAL)
+
+
+async def reconcile_startup_counters(batch_size: int = COUNTER_RECONCILE_BATCH_SIZE):
+    """Пересчет счетчиков стартапов из лайков, комментариев и событий просмотров"""
+    startups = Startup.__table__
+    shards = StartupCounterShard.__table__
+    # Одна группирующая выборка на источник для пачки стартапов; просмотры - из суточных
+    # агрегатов: в них свернуты и сырые события, удаленные по сроку хранения
+    sources = {
+        "likes_count": (Like.startup_id, func.count(), None),
+        "comments_count": (Comment.startup_id, func.count(), None),
+        "views_count": (AnalyticsRollupDaily.startup_id, func.sum(AnalyticsRollupDaily.count), AnalyticsRollupDaily.event_type == "view")
+    }
+    last_id = 0
+    total = 0
+    changed = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            # Блокируем строки стартапов и их слоты: приращения пачки ждут пересчета, а не теряются
+            current = (await db.execute(
+                select(startups.c.id, *(startups.c[name] for name in STARTUP_COUNTERS))
+                .where(startups.c.id > last_id)
+                .order_by(startups.c.id)
+                .limit(batch_size)
+                .with_for_update()
+            )).all()
+            if not current:
+                break
+            startup_ids = [row.id for row in current]
+            await db.execute(
+                select(shards.c.startup_id).where(shards.c.startup_id.in_(startup_ids)).with_for_update()
+            )
+            
+            counts = {startup_id: dict.fromkeys(STARTUP_COUNTERS, 0) for startup_id in startup_ids}
+            for name, (startup_column, aggregate, condition) in sources.items():
+                query = select(startup_column, aggregate).where(startup_column.in_(startup_ids)).group_by(startup_column)
+                if condition is not None:
+                    query = query.where(condition)
+                for startup_id, count in (await db.execute(query)).all():
+                    counts[startup_id][name] = int(count or 0)
+            
+            updates = [
+                {
+                    "b_startup_id": row.id,
+                    # Как и при приращениях: исправление одних просмотров не меняет версию и Last-Modified
+                    "b_version_step": 1 if any(
+                        (getattr(row, name) or 0) != counts[row.id][name] for name in STARTUP_COUNTERS if name != "views_count"
+                    ) else 0,
+                    **{f"b_{name}": counts[row.id][name] for name in STARTUP_COUNTERS}
+                }
+                for row in current
+                if any((getattr(row, name) or 0) != counts[row.id][name] for name in STARTUP_COUNTERS)
+            ]
+            if updates:
+                now = datetime.utcnow()
+                await db.execute(
+                    update(startups)
+                    .where(startups.c.id == bindparam("b_startup_id"))
+                    .values(
+                        version=startups.c.version + bindparam("b_version_step"),
+                        updated_at=case((bindparam("b_version_step") > 0, now), else_=startups.c.updated_at),
+                        **{name: bindparam(f"b_{name}") for name in STARTUP_COUNTERS}
+                    ),
+                    updates
+                )
+            # Несвернутые приращения уже учтены в пересчете
+            await db.execute(delete(shards).where(shards.c.startup_id.in_(startup_ids)))
+            await db.commit()
+            
+            last_id = startup_ids[-1]
+            total += len(startup_ids)
+            changed += len(updates)
+    print(f"✅ Счетчики стартапов пересчитаны: {total} стартапов, исправлено {changed}")
+
+
+# ==================== ТОЧКА ВХОДА ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Фоновые воркеры платформы")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("notifications", help="Доставка уведомлений из outbox в Telegram")
+    commands.add_parser("rematch", help="Пересчет мэтчинга после изменения профилей")
+    commands.add_parser("rebuild-feed", help="Заполнение ленты мэтчинга из AIAnalysis")
+    jobs_parser = commands.add_parser("jobs", help="Выполнение фоновых заданий (мэтчинг стартапов)")
+    jobs_parser.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY)
+    commands.add_parser("backfill-rollups", help="Пересчет агрегатов аналитики из сырых событий")
+    commands.add_parser("retention", help="Секции и срок хранения сырых событий (запуск раз в сутки)")
+    commands.add_parser("fold-counters", help="Сворачивание слотов счетчиков горячих стартапов")
+    commands.add_parser("reconcile-counters", help="Пересчет счетчиков стартапов из лайков, комментариев и просмотров")
+    
+    args = parser.parse_args()
+    if args.command == "notifications":
+        asyncio.run(run_notification_dispatcher())
+    elif args.command == "rematch":
+        asyncio.run(run_profile_rematcher())
+    elif args.command == "rebuild-feed":
+        asyncio.run(rebuild_match_feed())
+    elif args.command == "jobs":
+        asyncio.run(run_job_worker(args.concurrency))
+    elif args.command == "backfill-rollups":
+        asyncio.run(backfill_analytics_rollups())
+    elif args.command == "retention":
+        asyncio.run(run_event_retention())
+    elif args.command == "fold-counters":
+        asyncio.run(run_counter_folder())
+    elif args.command == "reconcile-counters":
+        asyncio.run(reconcile_startup_counters())
+
+
+if __name__ == "__main__":
+    main()